@@ -25,12 +25,11 @@ import networkx as nx
 import gmm
 
 # Growth rule: randomly add new structure
-def rand_add(base, new):
-    from numpy.random import randint
+def rand_add(base, new, rng):
     new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
     new_base=nx.compose(base,new)
-    base_connector=randint(base.number_of_nodes())
-    new_connector=randint(min(new.nodes()),max(new.nodes()))
+    base_connector=rng.randint(base.number_of_nodes())
+    new_connector=rng.randint(min(new.nodes()),max(new.nodes()))
     new_base.add_edge(base_connector,new_connector)
     return new_base
     
@@ -31,7 +31,7 @@ def barabasi_albert_simulation(test_graph, m, seed=None, verbose=False):
     
     # Required to change the growth rule dynamically, so 
     # we define it inside the simulation function
-    def barabasi_albert_growth(base, new):
+    def barabasi_albert_growth(base, new, rng=random):
         """
         Select m random nodes from new_nodes and connect each node to the nodes in base_nodes
         as a function of the degree of the node in base_nodes.  The basic "preferential 
@@ -46,7 +46,7 @@ def barabasi_albert_simulation(test_graph, m, seed=None, verbose=False):
         new_base=nx.compose(base,new)
 
         # Shuffle new_nodes
-        random.shuffle(new_nodes)
+        rng.shuffle(new_nodes)
 
         # Create edge test based on degree centrality
         base_degree=nx.degree_centrality(base).items()
@@ -59,10 +59,10 @@ def barabasi_albert_simulation(test_graph, m, seed=None, verbose=False):
             while edge_made is False:
                 # Randomly select a node in base and add connection
                 # based on its degree centrality
-                p=random.uniform()
-                j=random.randint(0,len(base_nodes))
+                p=rng.uniform()
+                j=rng.randint(0,len(base_nodes))
                 if p <= base_degree[j][1]:
-                    k=random.randint(len(new_nodes))    # Randomly select a new node
+                    k=rng.randint(len(new_nodes))    # Randomly select a new node
                     new_base.add_edge(new_nodes[k],base_degree[j][0])
                     edge_made=True
         return(new_base)
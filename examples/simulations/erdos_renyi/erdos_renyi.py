@@ -23,7 +23,7 @@ from numpy import arange, random
 from scipy import stats
 import matplotlib.pylab as plt
 
-def binomial_growth(base, new):
+def binomial_growth(base, new, rng=random):
     """
     For each node in new_nodes, add edge to nodes in base_nodes with probability p. 
     """
@@ -40,7 +40,7 @@ def binomial_growth(base, new):
     # forming a tie between a  node from the new structure and 
     # each node in the base structure
     for n in new_nodes:
-        edge_test=zip(random.uniform(size=len(base_nodes)), base_nodes)
+        edge_test=zip(rng.uniform(size=len(base_nodes)), base_nodes)
         for d,m in edge_test:
             if (d <= p):
                 new_base.add_edge(m, n)
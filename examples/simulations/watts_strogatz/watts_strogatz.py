@@ -32,7 +32,7 @@ def watts_strogatz_simulation(test_graph, k, p, seed=None, verbose=False):
     
     # Required to change the growth rule dynamically, so 
     # we define it inside the simulation function
-    def watts_strogatz_growth(base, new):
+    def watts_strogatz_growth(base, new, rng=random):
         """
         Select k random nodes from new_nodes and connect each node to the nodes in base_nodes
         with probability p.  
@@ -46,12 +46,12 @@ def watts_strogatz_simulation(test_graph, k, p, seed=None, verbose=False):
         new_base=nx.compose(base,new)
 
         # Shuffle base nodes for random selection
-        random.shuffle(base_nodes)
+        rng.shuffle(base_nodes)
 
         #  We take only the first k nodes from the shuffled set of new nodes. Then, with probability p, 
         # connect those nodes to all nodes in base_nodes.
         for n in base_nodes[0:k]:
-            edge_test=zip(random.uniform(size=len(new_nodes)), new_nodes)
+            edge_test=zip(rng.uniform(size=len(new_nodes)), new_nodes)
             for d,m in edge_test:
                 if (d <= p):
                     new_base.add_edge(m,n)
@@ -62,8 +62,8 @@ def watts_strogatz_simulation(test_graph, k, p, seed=None, verbose=False):
             cc_nodes=nx.connected_component_subgraphs(new_base)[1].nodes()
             new_edges=list()
             for i in range(k):
-                random.shuffle(mc_nodes)
-                random.shuffle(cc_nodes)
+                rng.shuffle(mc_nodes)
+                rng.shuffle(cc_nodes)
                 new_edges.append((mc_nodes[0], cc_nodes[0]))
             new_base.add_edges_from(new_edges)
         new_base.name=""
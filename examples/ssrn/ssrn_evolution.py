@@ -26,26 +26,25 @@ from gmm import *
 
 
 # A model of SSRN co-authorship evolution
-def ssrn_evo(base, new):
-    from numpy.random import randint,uniform
+def ssrn_evo(base, new, rng):
     new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
     # Growth rule: use new structure to fuse together components
     def comp_fuse(base, new):
         new_base=nx.compose(base,new)
         base_comps=nx.weakly_connected_component_subgraphs(base)
         # Select nodes to connect (fusion)
-        rand_comps=randint(0,nx.number_weakly_connected_components(base),2)
-        rand_node1=base_comps[0].nodes()[randint(0,base_comps[0].number_of_nodes())]
-        rand_node2=base_comps[1].nodes()[randint(0,base_comps[1].number_of_nodes())]
-        rand_node3=new.nodes()[randint(0,new.number_of_nodes())]
-        rand_node4=new.nodes()[randint(0,new.number_of_nodes())]
+        rand_comps=rng.randint(0,nx.number_weakly_connected_components(base),2)
+        rand_node1=base_comps[0].nodes()[rng.randint(0,base_comps[0].number_of_nodes())]
+        rand_node2=base_comps[1].nodes()[rng.randint(0,base_comps[1].number_of_nodes())]
+        rand_node3=new.nodes()[rng.randint(0,new.number_of_nodes())]
+        rand_node4=new.nodes()[rng.randint(0,new.number_of_nodes())]
         # Connect nodes
         new_base.add_edge(rand_node1,rand_node3)
         new_base.add_edge(rand_node2,rand_node4)
         return new_base
     # Stochastically fuse components (14% prob); otherwise,
     # simply add as new network component
-    if 0.14 > uniform():
+    if 0.14 > rng.uniform():
         new_base=comp_fuse(base,new)
         # Sanity check to maintain necessary bipartite structure
         while(nx.is_bipartite(new_base.to_undirected()) is False ):
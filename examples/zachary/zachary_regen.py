@@ -54,7 +54,7 @@ def node_ceiling_100(G):
         return True        
         
 # Growth rule for karate club
-def karate_rule(base, new):
+def karate_rule(base, new, rng):
     """
     The original karate club has two densly connected clusters, with a few critical bridges. This rule attempts 
     to simulate a growth function from this by first bringing together all components, then with a simple
@@ -66,12 +66,12 @@ def karate_rule(base, new):
     if nx.components.number_connected_components(base)>1:
         comps=nx.connected_components(base)
         # Select two random components and form bridge with new structure
-        rand_comps=random_integers(low=0,high=len(comps)-1,size=2)
+        rand_comps=rng.random_integers(low=0,high=len(comps)-1,size=2)
         # Select random node from each component
-        rand0=comps[rand_comps[0]][random_integers(low=0,high=len(comps[rand_comps[0]])-1)]
-        rand1=comps[rand_comps[1]][random_integers(low=0,high=len(comps[rand_comps[1]])-1)]
+        rand0=comps[rand_comps[0]][rng.random_integers(low=0,high=len(comps[rand_comps[0]])-1)]
+        rand1=comps[rand_comps[1]][rng.random_integers(low=0,high=len(comps[rand_comps[1]])-1)]
         while rand0==rand1:
-            rand1=comps[rand_comps[1]][random_integers(low=0,high=len(comps[rand_comps[1]])-1)]
+            rand1=comps[rand_comps[1]][rng.random_integers(low=0,high=len(comps[rand_comps[1]])-1)]
         outer_bound=[rand0,rand1]
         outer_bound.extend(range(base.number_of_nodes(),base.number_of_nodes()+((new.number_of_nodes())-1)))
         mapping=dict(zip(new.nodes(),outer_bound))
@@ -84,7 +84,7 @@ def karate_rule(base, new):
         pref_prob=[(b/norm_const) for (a,b) in cent]
         # Step through probability mass to find a node to attach to. Same method used in 
         # gmm.algorithms.draw_structure to select a probability weighted motif from the set.
-        draw=uniform()
+        draw=rng.uniform()
         node_index=0
         mass_sum=pref_prob[node_index]
         while draw>mass_sum:
@@ -29,3 +29,10 @@ import gmm
 from gmm import *
 import algorithms
 from algorithms import *
+import motifs
+import counting
+import shared
+import sampling
+import distribution
+import delta
+import rules
\ No newline at end of file
@@ -10,15 +10,22 @@ Email:    drew.conway@nyu.edu
 
 """
 __author__="Drew Conway (drew.conway@nyu.edu)"
-__all__=["simulate","draw_structure","motif_counts","get_motifs","all_graphs","poisson_mass"]
+__all__=["simulate","draw_structure","motif_counts","motif_distribution","get_motifs","all_graphs",
+    "poisson_mass","IncrementalCounter","MotifCache","motif_cache"]
 __docformat__ = "restructuredtext en"
 
-import copy
-import networkx as nx
-from numpy import mean, random
-from scipy import stats
+import collections
+import multiprocessing
+import numbers
+from counting import vf2_counts, esu_counts, matrix_counts, sample_counts, color_coding_counts
+from delta import graph_delta
+from distribution import MotifDistribution, _poisson_pmf
+from motifs import Motif, connected_codes, code_graph
+from sampling import AliasSampler, random_state, spawn, _search_cumulative
+from numpy import array_equal, asarray, mean, random
 
-def simulate(gmm, tau, poisson=True, seed=None, new_name="GMM Simulation"):
+def simulate(gmm, tau, poisson=True, seed=None, new_name="GMM Simulation", incremental=True,
+    counting="vf2", counting_options=None, refresh="always", batch_size=1, subscribers=None):
     """
     The primary function for generating networks using the graph motif modeling technique.  
     The function takes two arguments, a gmm object and a tau value, and returns a NetworkX 
@@ -34,14 +41,55 @@ def simulate(gmm, tau, poisson=True, seed=None, new_name="GMM Simulation"):
     poisson : A boolean value to declarse whether to use a Poisson probability mass when 
         calculating the motif distributions during the simulation
         
-    seed : int or array_like value to set the random seed for NumPy `RandomState`
+    seed : int, array_like or NumPy RandomState seeding the random numbers of this simulation, 
+        which defaults to the stream owned by the model, gmm.rng.  Separate streams for the motif 
+        draws, the growth rule and any estimated counts are spawned from it, see 
+        gmm.sampling.spawn, so the global NumPy random state is neither used nor changed.
     
     new_name : A string, the name the new graph generated by the simulation
     
+    incremental : A boolean value to declare whether motif counts should be carried over from 
+        the previous step and updated only around the structure added by the growth rule, 
+        rather than recounted over the entire base graph (default).  Both give identical counts.
+        
+    counting : A string naming the engine used to count motifs, see motif_counts.
+    
+    counting_options : An optional dictionary of keyword arguments passed to the counting 
+        engine, e.g. {"samples":500} when counting="sample".  Given {"workers":k} for "vf2" or 
+        "esu", one pool of k processes is started for the whole simulation rather than for each 
+        count, unless a pool is given with {"pool":p} or counting is incremental, when only the 
+        first count is made in full and the updates around added structure are serial.
+        
+    refresh : The policy for recomputing the motif distribution, which is held fixed between 
+        refreshes: "always" recomputes it at every step (default); "never" computes it once from 
+        the base structure at the start of the simulation; ("steps",k) recomputes it every k 
+        steps; and ("growth",x) recomputes it once the number of nodes or edges has grown by a 
+        fraction x (e.g. 0.1 for 10%) since the last refresh.  k must be a positive integer and 
+        x a positive number, or a ValueError is raised.
+        
+    batch_size : The number of motifs drawn at once from the motif distribution, which are 
+        applied by the growth rule one after another, with the termination rule checked after 
+        each.  The refresh policy is only checked once a batch is used up, so with the default 
+        refresh="always" the distribution is recomputed once for every batch_size motifs.
+        
+    subscribers : An optional list of functions called after every step as f(record,G), where G 
+        is the new base structure and record is a gmm.delta.StepRecord of the step number, the 
+        index of the motif drawn, and the nodes and edges added and removed.  Records of 
+        in-place growth rules are taken from the delta of the rule, see gmm.set_rule; those of 
+        rules returning a new base are found by comparing the new base with a copy of the nodes 
+        and edges of the old one, taken before the rule is applied in case it changes the old 
+        base in place, which is only done when there are subscribers.
+    
     Returns
     ----------
     gmm_sim : A NetworkX graph object derived from a graph motif model simualtion on a 
         given gmm object.
+        
+    Notes
+    -----
+    A summary of the run is stored in gmm.run_info, a dictionary with the keys tau, counting, 
+    poisson, incremental, refresh, batch_size, steps (the number of growth rule applications) and 
+    refreshes (the number of times the motif distribution was computed).
     """
     # First check that the user arguments pass inspection
     try:
@@ -53,24 +101,117 @@ def simulate(gmm, tau, poisson=True, seed=None, new_name="GMM Simulation"):
             raise ValueError("The value for tau must be greater than or equal to two")
         else:
             # Do simulation
-            if seed is not None:
-                random.seed(seed)
-            while gmm.apply_termination():
-                motif_dist=motif_counts(gmm,tau)    # Raw motif counts from gmm base graph
-                # Poission PMF used to estimate mass for all motifs? (default)
-                if poisson:
-                    motif_mass=poisson_mass(motif_dist)
-                # Otherwise, use count ratios
-                else:
-                    total_counts=sum([(c) for (a,b,c) in motif_dist])
-                    motif_mass=[(a,b,float(c)/total_counts) for (a,b,c) in motif_dist]
-                new_structure=draw_structure(motif_mass)
-                gmm.apply_rule(new_structure,set_result=True)
+            _check_refresh(refresh)
+            if batch_size<1:
+                raise ValueError("The batch size must be at least one")
+            rng=gmm.rng if seed is None else random_state(seed)
+            draw_rng,rule_rng,counting_rng=spawn(rng,3)
+            counting_options=dict() if counting_options is None else dict(counting_options)
+            if counting in _approximate_methods:
+                counting_options.setdefault("rng",counting_rng)
+            subscribers=list() if subscribers is None else list(subscribers)
+            # A pool of counting processes is started once and kept for the whole simulation, 
+            # unless the counts are kept incrementally and only the first is made in full
+            own_pool=None
+            if not incremental and counting in ("vf2","esu") and counting_options.get("workers",1)>1 and \
+                counting_options.get("pool") is None:
+                own_pool=counting_options["pool"]=multiprocessing.Pool(counting_options["workers"])
+            if incremental:
+                counter=IncrementalCounter(tau,gmm.get_base().is_directed(),counting,**counting_options)
+            # The counter follows the records of in-place growth instead of recounting
+            follow=incremental and refresh!="never"
+            if follow:
+                subscribers.insert(0,counter.record_step)
+            sampler=None
+            refreshed_step,refreshed_size=0,None
+            batch=list()
+            gmm.run_info=dict(tau=tau,counting=counting,poisson=poisson,incremental=incremental,
+                refresh=refresh,batch_size=batch_size,steps=0,refreshes=0)
+            try:
+                while gmm.apply_termination():
+                    base=gmm.get_base()
+                    # The distribution is only refreshed between batches
+                    if len(batch)==0 and (sampler is None or _due_refresh(refresh,
+                        gmm.run_info["steps"]-refreshed_step,(base.number_of_nodes(),base.number_of_edges()),
+                        refreshed_size)):
+                        # Raw motif counts from gmm base graph
+                        if incremental:
+                            motif_dist=counter.distribution(base)
+                        else:
+                            motif_dist=motif_distribution(gmm,tau,counting,**counting_options)
+                        # Poission PMF used to estimate mass for all motifs? (default)
+                        if poisson:
+                            motif_mass=motif_dist.poisson()
+                        # Otherwise, use count ratios
+                        else:
+                            motif_mass=motif_dist.count_ratio()
+                        # The alias table is rebuilt only when the motif distribution changes
+                        if sampler is None or not array_equal(sampler.weights,motif_mass.mass):
+                            sampler=motif_mass.sampler(draw_rng)
+                        refreshed_step=gmm.run_info["steps"]
+                        refreshed_size=(base.number_of_nodes(),base.number_of_edges())
+                        gmm.run_info["refreshes"]+=1
+                    if len(batch)==0:
+                        batch=motif_mass.draw(batch_size,sampler).tolist()[::-1]
+                    index=batch.pop()
+                    # A rule returning a new base may also have changed the old one in place, so the 
+                    # changes it publishes are found against a snapshot taken before it is applied
+                    publish=not gmm.inplace and len(subscribers)>(1 if follow else 0)
+                    previous=_snapshot(base) if publish else None
+                    gmm.apply_rule(motif_mass.motifs[index],set_result=True,rng=rule_rng)
+                    # Publish the changes made by this step
+                    if gmm.last_delta is not None:
+                        record=gmm.last_delta.record(gmm.run_info["steps"],index)
+                    elif publish:
+                        record=graph_delta(previous,gmm.get_base()).record(gmm.run_info["steps"],index)
+                    else:
+                        record=None
+                    if record is not None:
+                        for subscriber in subscribers:
+                            subscriber(record,gmm.get_base())
+                    gmm.run_info["steps"]+=1
+            finally:
+                if own_pool is not None:
+                    own_pool.terminate()
         # Reset name
         gmm.get_base().name=new_name
                 
                 
-def draw_structure(motif_mass):
+def _check_refresh(refresh):
+    """Raises a ValueError if refresh is not a motif distribution refresh policy"""
+    if refresh in ("always","never"):
+        return
+    if isinstance(refresh,tuple) and len(refresh)==2:
+        # Under Python 2 any value compares with a number, so the type is checked first
+        if refresh[0]=="steps" and isinstance(refresh[1],numbers.Integral) and refresh[1]>=1:
+            return
+        if refresh[0]=="growth" and isinstance(refresh[1],numbers.Real) and refresh[1]>0:
+            return
+    raise ValueError("Refresh policy must be \"always\", \"never\", (\"steps\",k) or (\"growth\",x): "+str(refresh))
+    
+    
+def _snapshot(G):
+    """Returns a graph of the type of G holding its nodes and edges, without their attributes"""
+    H=G.__class__()
+    H.add_nodes_from(G)
+    H.add_edges_from(G.edges_iter())
+    return H
+    
+    
+def _due_refresh(refresh, steps, size, refreshed_size):
+    """Returns True if the motif distribution should be recomputed under the refresh policy, 
+    given the number of steps since the last refresh and the (nodes,edges) of the base structure 
+    now and at the last refresh"""
+    if refresh=="always":
+        return True
+    if refresh=="never":
+        return False
+    if refresh[0]=="steps":
+        return steps>=refresh[1]
+    return any(new>=(1+refresh[1])*old for new,old in zip(size,refreshed_size))
+
+
+def draw_structure(motif_mass, sampler=None, size=None, rng=None):
     """
     Take a list of tuples of the construct (index,motif,probability mass) and takes a random
     draw of a motif based on the probability masses.
@@ -78,28 +219,40 @@ def draw_structure(motif_mass):
     Parameters
     ----------
     motf_mass : A list of tuples of the constructure (index,motif,probability mass), likely constructred
-        by the gmm_simulate function.
+        by the gmm_simulate function, or a gmm.distribution.MotifDistribution with an estimated 
+        mass, which is drawn from with MotifDistribution.draw.
+        
+    sampler : An optional gmm.sampling.AliasSampler built from the probability masses, which can 
+        be reused to draw in constant time for as long as the masses are unchanged.  If None an 
+        alias table is built for this draw.
+        
+    size : An optional number of independent draws.  If given, the indices of the drawn motifs are 
+        returned in a NumPy array rather than a motif, found in one vectorized step by searching 
+        the cumulative masses for uniform draws (or from sampler, if given).
+        
+    rng : A NumPy RandomState used for the draws when no sampler is given, defaults to the global 
+        NumPy state.
                 
     Returns 
     ----------
-    motif : A randomly drawn graph motif, as a NetworkX graph object
+    motif : A randomly drawn graph motif, or an array of size motif indices if size is given
     """
-    # Truncate probabilities around tau motifs
-    mass_sum=sum([(c) for (a,b,c) in motif_mass])
-    probabilities=map(lambda x: motif_mass[x][2]/mass_sum,range(len(motif_mass)))
-
-    # Step through probability mass to find appropriate 
-    # motif given a uniform draw
-    draw=random.uniform()
-    motif_index=0
-    mass_sum=probabilities[motif_index]
-    while draw>mass_sum:
-        motif_index+=1
-        mass_sum+=probabilities[motif_index]
-    return motif_mass[motif_index][1] # Return the appropriate motif
+    if isinstance(motif_mass,MotifDistribution):
+        return motif_mass.draw(size,sampler,rng)
+    if rng is None:
+        rng=random
+    if size is not None:
+        indices=asarray([(a) for (a,b,c) in motif_mass])
+        if sampler is not None:
+            return indices[sampler.draw(size)]
+        cumulative=asarray([(c) for (a,b,c) in motif_mass],dtype=float).cumsum()
+        return indices[_search_cumulative(cumulative,size,rng)]
+    if sampler is None:
+        sampler=AliasSampler([(c) for (a,b,c) in motif_mass],rng)
+    return motif_mass[sampler.draw()][1] # Return the appropriate motif
 
 
-def motif_counts(gmm,tau):
+def motif_counts(gmm,tau,method="vf2",occurrences=False,shared=False,**options):
     """
     Returns dictionary keyed by graph motifs and values as the number of subgraph isomorphisms 
     for the given motif counted in the base structure of the given GMM object.
@@ -111,29 +264,256 @@ def motif_counts(gmm,tau):
     tau : An integer greater than or equal to 2, which designates the number of nodes in the 
         largest graph in set of graph motifs used in the given model.
         
+    method : A string naming the counting engine.  "vf2" (default) searches for each motif 
+        separately with the NetworkX VF2 matcher; "esu" enumerates every connected subgraph 
+        of up to tau nodes once and classifies it, filling all counts in a single pass; 
+        "matrix" computes counts of undirected motifs with tau<=4 from identities on the degree 
+        sequence and sparse adjacency matrix, or a triad census of directed motifs with tau<=3, 
+        without any subgraph matching; "sample" estimates the counts from a random sample of 
+        nodes; "color-coding" estimates the counts from the colorful subgraphs under random 
+        colorings of the nodes, which keeps motifs of five to seven nodes tractable.
+        
+    occurrences : A boolean; if True count each occurrence of a motif in the base structure 
+        once.  Otherwise (default) each occurrence is counted once per automorphism of the 
+        motif, which is the number of subgraph isomorphisms found by nx.GraphMatcher.
+        
+    shared : A boolean; if True the base structure is exported to a SharedCSRGraph, see 
+        gmm.shared_base, and counted in that form.
+        
+    options : Keyword arguments passed to the counting engine.  For method="vf2" or "esu", 
+        workers=k divides the counting among k processes, and pool=p divides it among the 
+        processes of a multiprocessing.Pool kept by the caller.  For method="sample" these are 
+        samples, rel_error, confidence, intervals, fraction and rng, see 
+        gmm.counting.sample_counts.  For method="color-coding" these are repeats and rng, see 
+        gmm.counting.color_coding_counts.
+        
     Returns
     ----------
     subgraph_counts : A list of tuples with the following construction (index,motif,count), where 
         "count" is the number of subgraph isomorphisms for the given motif counted in the base 
-        structure of the given GMM object and index is the motif index.
+        structure of the given GMM object and index is the motif index.  For method="sample" 
+        with intervals=True, a tuple (subgraph_counts,intervals) is returned, where intervals 
+        is a list of tuples (index,low,high) of confidence bounds for each count.
     """
-    base=gmm.get_base()
+    base=gmm.shared_base() if shared else gmm.get_base()
     base_direction=base.is_directed()   # Check if GMM base is directed, motifs must match
     motif_counts=get_motifs(tau,base_direction)
     # Performing the counting of subgraph isomorphism for every motif given the base structure
-    for motif in motif_counts:
-        index=motif[0]
-        # Calculate subgraph ismorphisms
-        if base_direction:
-            GM=nx.DiGraphMatcher(base,motif[1])
-        else:
-            GM=nx.GraphMatcher(base,motif[1])
-        # Count subgraph isomorphisms and update
-        count=0
-        for i in GM.subgraph_isomorphisms_iter():
-            count+=1
-        motif_counts[index]=(index,motif_counts[index][1],count)
+    counts=_count_motifs(base,motif_counts,method,occurrences=occurrences,**options)
+    if options.get("intervals"):
+        counts,bounds=counts
+        intervals=[(index,low,high) for (index,(low,high)) in enumerate(bounds)]
+    for index,motif,count in motif_counts:
+        motif_counts[index]=(index,motif,counts[index])
+    if options.get("intervals"):
+        return motif_counts,intervals
     return motif_counts
+    
+    
+def motif_distribution(gmm,tau,method="vf2",occurrences=False,shared=False,**options):
+    """
+    Returns the motif counts of the base structure of the given GMM object as a 
+    gmm.distribution.MotifDistribution, whose motifs are the shared set held by motif_cache and 
+    whose counts are a NumPy array.  The arguments are those of motif_counts, except that 
+    confidence intervals are not returned.
+    
+    Examples
+    ----------
+    >>> dist=motif_distribution(model,3)
+    >>> motif=dist.poisson().draw()
+    """
+    base=gmm.shared_base() if shared else gmm.get_base()
+    motifs=get_motifs(tau,base.is_directed())
+    options.pop("intervals",None)
+    counts=_count_motifs(base,motifs,method,occurrences=occurrences,**options)
+    return MotifDistribution(motif_cache.get(tau,base.is_directed()),counts)
+
+
+class IncrementalCounter(object):
+    """
+    Keeps the motif counts of a growing base graph between simulation steps.  Rather than 
+    recounting every subgraph isomorphism after each application of the growth rule, only the 
+    isomorphisms that touch a node whose neighborhood changed are removed from the previous 
+    counts and recounted in the new graph.  Any subgraph of at most tau nodes that touches 
+    none of those nodes is identical in both graphs, so the updated counts are exact.
+    
+    Parameters
+    ----------
+    tau : An integer greater than or equal to 2, which designates the number of nodes in the 
+        largest graph in set of graph motifs used in the given model.
+        
+    directed_motifs : A boolean designating whether the motifs should be directed.
+    
+    method : A string naming the counting engine, as in motif_counts.
+    
+    occurrences : A boolean designating whether occurrences rather than subgraph isomorphisms 
+        are counted, as in motif_counts.
+        
+    options : Keyword arguments passed to the counting engine, as in motif_counts.
+    
+    Notes
+    -----
+    The previous base graph must be left unaltered by the growth rule, as it is by rules that 
+    return a new graph from nx.compose.  If the same graph object is passed to update twice 
+    it has been altered in place; the counts are then updated from the step records passed 
+    to record_step since the last update, as simulate does for in-place growth rules, or 
+    recomputed in full if there are none or they remove nodes or edges.  Estimated counts, 
+    e.g. from method="sample" or "color-coding", are always recomputed in full.
+    """
+    def __init__(self, tau, directed_motifs, method="vf2", occurrences=False, **options):
+        self.tau=tau
+        self.method=method
+        self.occurrences=occurrences
+        # Counts are stored without confidence intervals, as in motif_distribution
+        options.pop("intervals",None)
+        self.options=options
+        self.motifs=get_motifs(tau,directed_motifs)
+        self.motif_set=motif_cache.get(tau,directed_motifs)
+        self.graph=None
+        self.counts=None
+        self.pending=list()
+        
+    def count(self, G):
+        """Counts all motifs in G from scratch and stores the result"""
+        self._count(G)
+        return self.motif_counts()
+        
+    def update(self, G):
+        """Updates the stored counts to match G, which is taken to be the graph following the 
+        last one counted, and returns them as a list of (index,motif,count) tuples"""
+        self._update(G)
+        return self.motif_counts()
+        
+    def distribution(self, G):
+        """Updates the stored counts to match G, as update does, and returns them as a 
+        gmm.distribution.MotifDistribution"""
+        self._update(G)
+        return MotifDistribution(self.motif_set,self.counts.copy())
+        
+    def record_step(self, record, G=None):
+        """Keeps a gmm.delta.StepRecord of changes made in place to the last graph counted, which 
+        are applied to the counts at the next update.  This is a simulate subscriber, and records 
+        of changes to any graph G other than the last one counted are ignored."""
+        if G is None or G is self.graph:
+            self.pending.append(record)
+        
+    def motif_counts(self):
+        """Returns the stored counts as a list of (index,motif,count) tuples"""
+        return [(i,m,c) for i,m,c in zip(xrange(len(self.motif_set)),self.motif_set,self.counts.tolist())]
+        
+    def _count(self, G):
+        """Counts all motifs in G from scratch into the array of stored counts"""
+        self.counts=asarray(_count_motifs(G,self.motifs,self.method,occurrences=self.occurrences,
+            **self.options))
+        self.graph=G
+        self.pending=list()
+        
+    def _update(self, G):
+        """Adds the change in counts around the nodes touched in going to G to the stored counts"""
+        if self.graph is None or self.method in _approximate_methods:
+            return self._count(G)
+        if G is self.graph:
+            if len(self.pending)==0 or any(r.removed_nodes or r.removed_edges for r in self.pending):
+                return self._count(G)
+            return self._update_added(G)
+        touched=_touched_nodes(self.graph,G)
+        if len(touched)>0:
+            old_counts=self._local_counts(self.graph,[n for n in touched if n in self.graph])
+            new_counts=self._local_counts(G,[n for n in touched if n in G])
+            self.counts=self.counts+(asarray(new_counts)-asarray(old_counts))
+        self.graph=G
+        self.pending=list()
+        
+    def _update_added(self, G):
+        """Updates the counts from the nodes and edges added to G in the pending step records.  
+        The graph before the additions is rebuilt around the touched nodes by removing them from 
+        a local copy of G, which holds every subgraph of the old graph that touches them."""
+        added_nodes=[n for r in self.pending for n in r.nodes]
+        added_edges=[e for r in self.pending for e in r.edges]
+        touched=set(added_nodes)
+        for u,v in added_edges:
+            touched.add(u)
+            touched.add(v)
+        new_local=G.subgraph(_neighborhood(G,touched,self.tau-1))
+        old_local=new_local.copy()
+        old_local.remove_edges_from(added_edges)
+        old_local.remove_nodes_from(added_nodes)
+        old_counts=self._anchored_counts(old_local,[n for n in touched if n in old_local])
+        new_counts=self._anchored_counts(new_local,list(touched))
+        self.counts=self.counts+(asarray(new_counts)-asarray(old_counts))
+        self.pending=list()
+        
+    def _local_counts(self, G, anchors):
+        """Counts the subgraph isomorphisms in G that map onto at least one anchor node, 
+        searching only the nodes within tau-1 steps of the anchors"""
+        if len(anchors)==0:
+            return [0]*len(self.motifs)
+        return self._anchored_counts(G.subgraph(_neighborhood(G,anchors,self.tau-1)),anchors)
+        
+    def _anchored_counts(self, local, anchors):
+        """Counts the subgraph isomorphisms in the graph local that map onto at least one anchor"""
+        if len(anchors)==0:
+            return [0]*len(self.motifs)
+        # Local counts are too small to be worth dividing among worker processes
+        options=dict((k,v) for k,v in self.options.iteritems() if k not in ("workers","pool"))
+        return _count_motifs(local,self.motifs,self.method,anchors,self.occurrences,**options)
+        
+
+# Motif counting engines by name, and the engines whose counts are estimates
+_counting_methods={"vf2":vf2_counts,"esu":esu_counts,"matrix":matrix_counts,"sample":sample_counts,
+    "color-coding":color_coding_counts}
+_approximate_methods=set(["sample","color-coding"])
+
+def _count_motifs(G, motifs, method, anchors=None, occurrences=False, **options):
+    """Returns the subgraph isomorphism counts in G for each motif using the named counting 
+    engine.  If a list of anchor nodes is given, only isomorphisms onto at least one count."""
+    try:
+        engine=_counting_methods[method]
+    except KeyError:
+        raise ValueError("Unknown motif counting method: "+str(method))
+    return engine(G,motifs,anchors,occurrences,**options)
+    
+
+def _neighborhood(G, nodes, radius):
+    """Returns the set of nodes within radius steps of any of the given nodes, ignoring edge 
+    direction"""
+    seen=set(nodes)
+    frontier=list(seen)
+    for r in xrange(radius):
+        next_frontier=list()
+        for u in frontier:
+            if G.is_directed():
+                nbrs=G.successors(u)+G.predecessors(u)
+            else:
+                nbrs=G.neighbors_iter(u)
+            for v in nbrs:
+                if v not in seen:
+                    seen.add(v)
+                    next_frontier.append(v)
+        frontier=next_frontier
+    return seen
+    
+    
+def _touched_nodes(old, new):
+    """Returns the set of nodes that were added, removed, or had an incident edge added or removed 
+    in going from graph old to graph new"""
+    touched=set()
+    if new.is_directed():
+        old_adj,new_adj=old.succ,new.succ
+    else:
+        old_adj,new_adj=old.adj,new.adj
+    for u,nbrs in new_adj.iteritems():
+        if u not in old_adj:
+            touched.add(u)
+            touched.update(nbrs)
+        elif nbrs.viewkeys()!=old_adj[u].viewkeys():
+            touched.add(u)
+            touched.update(nbrs.viewkeys()^old_adj[u].viewkeys())
+    for u,nbrs in old_adj.iteritems():
+        if u not in new_adj:
+            touched.add(u)
+            touched.update(nbrs)
+    return touched
 
 
 def get_motifs(tau,directed_motifs):
@@ -153,18 +533,71 @@ def get_motifs(tau,directed_motifs):
         
     Returns
     ----------
-    motifs : A list of tuples of the following construction (index,motif,0).  The final zero is used as 
-        is a placeholder and will set the counts of subgraph isomorphism for each motif in the GMM's 
-        base structure.
+    motifs : A list of tuples of the following construction (index,motif,0), where motif is a 
+        gmm.motifs.Motif.  The final zero is used as is a placeholder and will set the counts of 
+        subgraph isomorphism for each motif in the GMM's base structure.
+        
+    Notes
+    -----
+    Motifs are ordered by number of nodes, then number of edges, then canonical code.  Those of 
+    up to six nodes (undirected) or four nodes (directed) are read from the motif atlas shipped 
+    with the package, see all_graphs.
+    
+    The Motif objects are shared between calls through motif_cache, so only the list of 
+    tuples is new on each call.  A motif is converted to a NetworkX graph with 
+    Motif.to_networkx, as gmm.apply_rule does before applying the growth rule.
+    """
+    return [(i,g,0) for i,g in enumerate(motif_cache.get(tau,directed_motifs))]
+
+
+class MotifCache(object):
+    """
+    A least recently used cache of motif sets, keyed by (tau,directed_motifs).  Each set is a 
+    tuple of Motif objects in the order of get_motifs, built from the canonical codes of 
+    connected graphs when it is first requested.
+    
+    Parameters
+    ----------
+    maxsize : The largest number of motif sets held; the least recently used set is dropped 
+        when another is added.
     """
-    motifs=list()
-    motif_index=0
-    for v in xrange(2,tau+1):
-        graphs=all_graphs(v,directed_motifs)
-        for g in graphs:
-            motifs.append((motif_index,g,0))
-            motif_index+=1
-    return motifs
+    CacheInfo=collections.namedtuple("CacheInfo",["hits","misses","maxsize","currsize"])
+    
+    def __init__(self, maxsize=16):
+        self.maxsize=maxsize
+        self.sets=collections.OrderedDict()
+        self.hits=0
+        self.misses=0
+        
+    def get(self, tau, directed_motifs):
+        """Returns the tuple of motifs with two to tau nodes"""
+        key=(tau,bool(directed_motifs))
+        try:
+            motifs=self.sets.pop(key)
+            self.hits+=1
+        except KeyError:
+            motifs=tuple(Motif(v,mask,directed_motifs) for v in xrange(2,tau+1)
+                for mask in connected_codes(v,directed_motifs))
+            self.misses+=1
+            while self.sets and len(self.sets)>=self.maxsize:
+                self.sets.popitem(last=False)
+        if self.maxsize>0:
+            self.sets[key]=motifs
+        return motifs
+        
+    def cache_info(self):
+        """Returns the hits, misses, maximum and current size of the cache"""
+        return self.CacheInfo(self.hits,self.misses,self.maxsize,len(self.sets))
+        
+    def cache_clear(self):
+        """Empties the cache and resets its statistics"""
+        self.sets.clear()
+        self.hits=0
+        self.misses=0
+        
+
+# Process-wide cache of the motif sets returned by get_motifs
+motif_cache=MotifCache()
         
         
 def all_graphs(num_nodes,directed_motifs):
@@ -180,37 +613,16 @@ def all_graphs(num_nodes,directed_motifs):
 
     Returns
     ----------
-    graphs : A list of all possible single component graphs given some number of nodes
+    graphs : A list of all possible single component graphs given some number of nodes, with exactly 
+        one graph from each isomorphism class, ordered by number of edges and then canonical code.
+        
+    Notes
+    -----
+    The graphs are read from the motif atlas or generated by adding one node at a time to the 
+    single component graphs with one fewer node, keeping one graph for each canonical code, see 
+    gmm.motifs.connected_codes.
     """
-    graphs=list()
-    complete=nx.complete_graph(num_nodes)    # Start with complete graph
-    complete_copy=copy.deepcopy(complete)
-    if directed_motifs:
-        complete=complete.to_directed()
-        complete_copy=complete_copy.to_directed()
-        complete_ud=all_graphs(num_nodes,False) # RECURSION, FTW!
-    edges=complete.edges()
-    while complete.number_of_edges()>0:
-        # Iteratively remove edges, and capture single component subgraphs
-        e=edges.pop()
-        complete.remove_edge(e[0],e[1])
-        if directed_motifs:
-            if nx.number_weakly_connected_components(complete)==1:
-                graphs.append(copy.deepcopy(complete))
-        else:
-            if nx.number_connected_components(complete)==1:
-                graphs.append(copy.deepcopy(complete))
-    graphs.append(complete_copy)
-    # Add recursively produced undirected graphs to directed set
-    if directed_motifs:
-        graphs_edges=map(lambda g: g.edges(), graphs)
-        graphs_edges.sort()
-        for i in complete_ud:
-            ud_edges=i.edges()
-            ud_edges.sort()
-            if ud_edges not in graphs_edges:
-                graphs.append(i.to_directed())
-    return graphs
+    return [code_graph(num_nodes,mask,directed_motifs) for mask in connected_codes(num_nodes,directed_motifs)]
     
     
 def poisson_mass(motif_counts):
@@ -220,6 +632,7 @@ def poisson_mass(motif_counts):
     Parameters
     ----------
     motif_counts :  A dictionary of motif counts keyed by (order, motif) tuples with count values.
+        A gmm.distribution.MotifDistribution is returned as MotifDistribution.poisson().
     
     Returns
     ----------
@@ -242,15 +655,15 @@ def poisson_mass(motif_counts):
     for every motif in the model. In some cases a motif may have a zero probability given some
     base structure.  This method will prevent that outcome.
     """
+    if isinstance(motif_counts,MotifDistribution):
+        return motif_counts.poisson()
     counts=[(c) for (a,b,c) in motif_counts]
     mu=counts.index(max(counts))
-    # Use SciPy's Poisson PMF calculation function
-    motif_pmf=map(lambda x: stats.poisson.pmf(x,mu),range(len(counts)))
+    motif_pmf=_poisson_pmf(mu,len(counts)).tolist()
     for i in range(len(motif_pmf)):
         motif_counts[i]=(motif_counts[i][0],motif_counts[i][1],motif_pmf[i])
     return(motif_counts)
 
-        
 
 if __name__ == '__main__':
     pass
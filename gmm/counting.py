@@ -0,0 +1,787 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+counting.py
+
+Purpose:  Engines for counting the occurrences of graph motifs in the base structure of a
+          Graph Motif Model.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["vf2_counts","esu_counts","matrix_counts","sample_counts","color_coding_counts"]
+__docformat__ = "restructuredtext en"
+
+import itertools
+import multiprocessing
+import networkx as nx
+from numpy import asarray, ones, random, sqrt, zeros
+from scipy import sparse, stats
+from motifs import Motif, graph_code, graph_mask, canonical_code, automorphisms, symmetry_conditions
+from shared import SharedCSRGraph, _NeighborSets
+
+def vf2_counts(G, motifs, anchors=None, occurrences=False, workers=None, pool=None):
+    """
+    Counts subgraph isomorphisms for a set of motifs by searching for each motif separately 
+    with the NetworkX VF2 matcher.  Symmetry breaking conditions derived from the automorphisms 
+    of each motif are added to the search, so every occurrence of a motif is found once rather 
+    than once per automorphism.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a SharedCSRGraph, which is converted back to 
+        a NetworkX graph for a serial search.
+
+    motifs : A list of tuples of the construct (index,motif,count), as returned by get_motifs.
+
+    anchors : An optional list of nodes in G.  If given, only subgraphs that contain at least
+        one of the anchor nodes are counted.
+        
+    occurrences : A boolean; if True the number of distinct occurrences of each motif is 
+        returned, otherwise each occurrence is multiplied by the number of automorphisms of 
+        the motif to give the count of all subgraph isomorphisms (default).
+        
+    workers : An optional number of processes; if greater than one the motifs are divided 
+        among a pool of worker processes.
+        
+    pool : An optional multiprocessing.Pool among which the motifs are divided instead, which 
+        is kept by the caller between calls, as simulate does, so no processes are started.  
+        The compressed sparse row arrays of the graph are sent with each of the workers 
+        (default: the CPU count) tasks.
+
+    Notes
+    -----
+    Worker processes are given G as a SharedCSRGraph, read from shared memory by the workers of 
+    a pool started for the count, and search a graph of its node indices, ranked by index, 
+    rather than a copy of the NetworkX graph.  Self loops are dropped from that graph.
+
+    Returns
+    ----------
+    counts : A list of counts for each motif, in the order of motifs.
+    """
+    directed=G.is_directed()
+    graphs=[b.to_networkx() if isinstance(b,Motif) else b for (a,b,c) in motifs]
+    if pool is not None or (workers is not None and workers>1):
+        if not isinstance(G,SharedCSRGraph):
+            G=SharedCSRGraph(G)
+        if anchors is not None:
+            index=dict((v,i) for i,v in enumerate(G.nodes()))
+            anchors=set(index[v] for v in anchors)
+        if pool is not None:
+            # Each task carries the CSR arrays, so the motifs are dealt into one task per worker
+            num_chunks=min(len(graphs),workers or multiprocessing.cpu_count())
+            tasks=[(G._succ,directed,anchors,graphs[i::num_chunks]) for i in xrange(num_chunks)]
+            chunk_counts=pool.map(_vf2_task,tasks,chunksize=1)
+            counts=[0]*len(graphs)
+            for i,chunk in enumerate(chunk_counts):
+                counts[i::num_chunks]=chunk
+        else:
+            pool=multiprocessing.Pool(workers,_init_vf2_worker,(G,anchors))
+            try:
+                counts=pool.map(_vf2_worker,graphs,chunksize=1)
+            finally:
+                pool.terminate()
+    else:
+        G=_networkx(G)
+        if anchors is not None:
+            anchors=set(anchors)
+        rank=dict((v,i) for i,v in enumerate(G))
+        counts=[_vf2_count(G,motif,rank,anchors) for motif in graphs]
+    if occurrences:
+        return counts
+    return _scale_counts(counts,motifs,directed)
+
+
+def _vf2_count(G, motif, rank, anchors):
+    """Returns the number of occurrences of motif in G found by a symmetry breaking VF2 search, 
+    in which nodes of G are compared by rank"""
+    nodes=motif.nodes()
+    conditions=symmetry_conditions(len(nodes),graph_mask(motif,nodes),G.is_directed())
+    conditions=[(nodes[u],nodes[v]) for (u,v) in conditions]
+    if G.is_directed():
+        GM=_SymmetricDiGraphMatcher(G,motif,conditions,rank)
+    else:
+        GM=_SymmetricGraphMatcher(G,motif,conditions,rank)
+    count=0
+    for mapping in GM.subgraph_isomorphisms_iter():
+        if anchors is None or not anchors.isdisjoint(mapping):
+            count+=1
+    return count
+    
+
+class _SymmetryBreaking(object):
+    """Semantic feasibility check enforcing symmetry breaking conditions on a VF2 search of
+    the subgraphs of G1 isomorphic to G2"""
+    def __init__(self, G1, G2, conditions, rank):
+        super(_SymmetryBreaking,self).__init__(G1,G2)
+        self.rank=rank
+        self.lower=dict()   # Motif nodes that must be matched to lower ranked nodes
+        self.higher=dict()  # Motif nodes that must be matched to higher ranked nodes
+        for u,v in conditions:
+            self.higher.setdefault(u,[]).append(v)
+            self.lower.setdefault(v,[]).append(u)
+            
+    def semantic_feasibility(self, G1_node, G2_node):
+        rank=self.rank[G1_node]
+        for v in self.higher.get(G2_node,[]):
+            if v in self.core_2 and self.rank[self.core_2[v]]<rank:
+                return False
+        for u in self.lower.get(G2_node,[]):
+            if u in self.core_2 and self.rank[self.core_2[u]]>rank:
+                return False
+        return True
+        
+
+class _SymmetricGraphMatcher(_SymmetryBreaking,nx.GraphMatcher):
+    pass
+    
+
+class _SymmetricDiGraphMatcher(_SymmetryBreaking,nx.DiGraphMatcher):
+    pass
+    
+
+def esu_counts(G, motifs, anchors=None, occurrences=False, workers=None, pool=None):
+    """
+    Counts subgraph isomorphisms for a set of motifs in a single pass over the graph.  Every
+    connected induced subgraph with as many nodes as the largest motif is enumerated exactly
+    once using the ESU algorithm (Wernicke, 2006), and classified by its canonical code.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a SharedCSRGraph.
+
+    motifs : A list of tuples of the construct (index,motif,count), as returned by get_motifs.
+
+    anchors : An optional list of nodes in G.  If given, only subgraphs that contain at least
+        one of the anchor nodes are counted.
+        
+    occurrences : A boolean; if True the number of distinct occurrences of each motif is 
+        returned, otherwise each occurrence is multiplied by the number of automorphisms of 
+        the motif to give the count of all subgraph isomorphisms, as found by nx.GraphMatcher 
+        (default).
+        
+    workers : An optional number of processes; if greater than one the root nodes of the 
+        enumeration are divided among a pool of worker processes, which read the graph from 
+        a SharedCSRGraph rather than receiving a copy of it.
+        
+    pool : An optional multiprocessing.Pool among which the root nodes are divided instead, 
+        which is kept by the caller between calls, as simulate does, so no processes are 
+        started.  The compressed sparse row arrays of the graph are sent with each of the 
+        workers (default: the CPU count) tasks, as processes already running cannot inherit 
+        the shared memory.
+
+    Returns
+    ----------
+    counts : A list of counts for each motif, in the order of motifs.
+    """
+    max_nodes=max([b.number_of_nodes() for (a,b,c) in motifs])
+    found=_esu_occurrences(G,max_nodes,anchors,workers,pool)
+    counts=[found.get(graph_code(b),0) for (a,b,c) in motifs]
+    if occurrences:
+        return counts
+    return _scale_counts(counts,motifs,G.is_directed())
+
+
+def sample_counts(G, motifs, anchors=None, occurrences=False, samples=1000, rel_error=None,
+    confidence=0.95, intervals=False, fraction=1.0, rng=None):
+    """
+    Estimates motif counts from a random sample of root nodes.  For each sampled node every 
+    connected induced subgraph containing it is enumerated, and a subgraph of k nodes adds 1/k 
+    to the score of its motif, so that the scores summed over all nodes are exactly the motif 
+    counts.  The counts are estimated by the mean score of the sampled nodes times the number 
+    of nodes in G, with normal confidence intervals from the variance of the scores.  Around 
+    nodes of high degree the enumeration itself can be sampled, as in RAND-ESU (Wernicke, 2006), 
+    by following each extension beyond the neighbors of the root with some probability.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a SharedCSRGraph.
+
+    motifs : A list of tuples of the construct (index,motif,count), as returned by get_motifs.
+
+    anchors : Not supported by sampled counts, must be None.
+        
+    occurrences : A boolean, as in vf2_counts.
+    
+    samples : The largest number of nodes to sample, drawn uniformly with replacement.
+    
+    rel_error : An optional target relative error.  If given, nodes are sampled in batches 
+        until the half-width of the confidence interval of every non-zero estimate is at most 
+        rel_error times the estimate, or samples nodes have been drawn.
+        
+    confidence : The confidence level of the intervals.
+    
+    intervals : A boolean; if True the confidence intervals are returned with the estimates.
+    
+    fraction : The probability of following each extension of a subgraph of two or more nodes 
+        while enumerating the subgraphs containing a sampled node.  Subgraphs are weighted by 
+        the inverse of the probability of reaching them, so the estimates remain unbiased.
+    
+    rng : A NumPy RandomState used to draw the sample, defaults to the global NumPy state.
+
+    Returns
+    ----------
+    counts : A list of estimated counts for each motif, in the order of motifs.  If intervals is 
+        True a tuple (counts,intervals) is returned, where intervals is a list of (low,high) 
+        bounds for each motif.
+    """
+    if anchors is not None:
+        raise ValueError("Sampled motif counts cannot be restricted to anchor nodes")
+    if samples<1:
+        raise ValueError("At least one node must be sampled")
+    if rng is None:
+        rng=random
+    directed=G.is_directed()
+    codes=[graph_code(b) for (a,b,c) in motifs]
+    max_nodes=max([n for (n,mask) in codes])
+    nodes=G.nodes()
+    adj,succ=_adjacency(G,nodes)
+    position=dict()
+    for i,code in enumerate(codes):
+        position.setdefault(code,[]).append(i)
+    z=stats.norm.ppf(0.5+confidence/2.0)
+    total=zeros(len(motifs))
+    squares=zeros(len(motifs))
+    drawn=0
+    batch=samples if rel_error is None else min(samples,100)
+    while drawn<samples:
+        for root in rng.randint(0,len(nodes),size=min(batch,samples-drawn)):
+            # Count every subgraph containing root, by extending from it with no node excluded
+            raw_counts=dict()
+            if fraction<1:
+                _rand_esu_extend([root],list(adj[root]),adj[root]|set([root]),1.0,adj,succ,directed,
+                    max_nodes,raw_counts,fraction,rng)
+            else:
+                _esu_extend([root],list(adj[root]),adj[root]|set([root]),-1,0,adj,succ,directed,
+                    max_nodes,raw_counts)
+            score=zeros(len(motifs))
+            for code,count in _classify(raw_counts,max_nodes,directed).iteritems():
+                for i in position.get(code,[]):
+                    score[i]+=float(count)/code[0]
+            total+=score
+            squares+=score**2
+            drawn+=1
+        mean=total/drawn
+        deviation=sqrt(max(drawn-1,1)**-1*(squares-drawn*mean**2).clip(0))
+        estimates=len(nodes)*mean
+        half_width=len(nodes)*z*deviation/sqrt(drawn)
+        if rel_error is not None and (half_width<=rel_error*estimates).all():
+            break
+    scale=[1]*len(motifs) if occurrences else _scale_counts([1]*len(motifs),motifs,directed)
+    counts=[float(e*a) for e,a in zip(estimates,scale)]
+    if not intervals:
+        return counts
+    bounds=[(float(max(e-h,0)*a),float((e+h)*a)) for e,h,a in zip(estimates,half_width,scale)]
+    return counts,bounds
+
+
+def color_coding_counts(G, motifs, anchors=None, occurrences=False, repeats=10, rng=None):
+    """
+    Estimates motif counts by color coding (Alon, Yuster and Zwick, 1995).  For each repeat
+    the nodes of G are colored uniformly at random with k colors, k being the number of nodes
+    in the largest motif, and only the colorful connected induced subgraphs, whose nodes all
+    have distinct colors, are enumerated by ESU.  An extension by a node whose color is already
+    in the subgraph is never followed, which prunes most of the enumeration for motifs of five
+    or more nodes.  A subgraph of s nodes is colorful with probability k!/((k-s)!k^s), so the
+    colorful counts divided by that probability are unbiased estimates of the motif counts,
+    which are averaged over the repeats.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a SharedCSRGraph.
+
+    motifs : A list of tuples of the construct (index,motif,count), as returned by get_motifs.
+
+    anchors : Not supported by color coded counts, must be None.
+
+    occurrences : A boolean, as in vf2_counts.
+
+    repeats : The number of random colorings.  The variance of the estimates falls in
+        proportion to 1/repeats, while the time taken grows in proportion to repeats.
+
+    rng : A NumPy RandomState used to draw the colorings, defaults to the global NumPy state.
+
+    Returns
+    ----------
+    counts : A list of estimated counts for each motif, in the order of motifs.
+    """
+    if anchors is not None:
+        raise ValueError("Color coded motif counts cannot be restricted to anchor nodes")
+    if rng is None:
+        rng=random
+    directed=G.is_directed()
+    max_nodes=max([b.number_of_nodes() for (a,b,c) in motifs])
+    nodes=G.nodes()
+    adj,succ=_adjacency(G,nodes)
+    raw_counts=dict()
+    for r in xrange(repeats):
+        colors=rng.randint(0,max_nodes,size=len(nodes)).tolist()
+        for root in xrange(len(nodes)):
+            extension=[u for u in adj[root] if u>root and colors[u]!=colors[root]]
+            _colorful_esu_extend([root],extension,adj[root]|set([root]),root,0,1<<colors[root],adj,
+                succ,directed,max_nodes,colors,raw_counts)
+    found=_classify(raw_counts,max_nodes,directed)
+    estimates=list()
+    for (a,b,c) in motifs:
+        code=graph_code(b)
+        colorful=1.0
+        for i in xrange(code[0]):
+            colorful*=float(max_nodes-i)/max_nodes
+        estimates.append(found.get(code,0)/(colorful*repeats))
+    if occurrences:
+        return estimates
+    return _scale_counts(estimates,motifs,directed)
+
+
+def _colorful_esu_extend(subgraph, extension, closed, root, mask, used, adj, succ, directed, max_nodes,
+    colors, raw_counts):
+    """Recursive step of ESU restricted to colorful subgraphs, as _esu_extend.  The colors in the
+    subgraph are held in the bitmask used, and the extension set holds no node of a used color."""
+    n=len(subgraph)
+    if n>1:
+        key=(n,mask)
+        raw_counts[key]=raw_counts.get(key,0)+1
+    if n==max_nodes:
+        return
+    extension=list(extension)
+    while extension:
+        w=extension.pop()
+        new_used=used|1<<colors[w]
+        # Nodes of a used color are left out of the extension set, but still closed to ESU
+        new_extension=[u for u in extension if not new_used>>colors[u]&1]
+        new_extension.extend(u for u in adj[w] if u>root and u not in closed and not new_used>>colors[u]&1)
+        new_mask=mask
+        for i,v in enumerate(subgraph):
+            if directed:
+                if w in succ[v]:
+                    new_mask|=1<<(i*max_nodes+n)
+                if v in succ[w]:
+                    new_mask|=1<<(n*max_nodes+i)
+            elif v in adj[w]:
+                new_mask|=1<<(i*max_nodes+n)
+        _colorful_esu_extend(subgraph+[w],new_extension,closed|adj[w],root,new_mask,new_used,adj,succ,
+            directed,max_nodes,colors,raw_counts)
+
+
+def _scale_counts(counts, motifs, directed):
+    """Multiplies the occurrence count of each motif by its number of automorphisms"""
+    scaled=list()
+    for count,(index,motif,c) in zip(counts,motifs):
+        n,mask=graph_code(motif)
+        scaled.append(count*automorphisms(n,mask,directed))
+    return scaled
+
+
+def _esu_occurrences(G, max_nodes, anchors=None, workers=None, pool=None):
+    """Returns a dictionary of the number of connected induced subgraphs of G with two to
+    max_nodes nodes, keyed by canonical code.  If anchors are given only subgraphs containing
+    at least one of them are counted.  If a pool is given, or workers is greater than one, the 
+    roots are divided among a pool of processes."""
+    if anchors is None:
+        nodes=G.nodes()
+        num_roots=len(nodes)
+    else:
+        G=_networkx(G)
+        anchor_set=set(anchors)
+        nodes=list(anchors)+[v for v in G if v not in anchor_set]
+        num_roots=len(anchors)
+    # Relabel nodes to integers, with the roots first
+    if pool is not None or (workers is not None and workers>1):
+        if not isinstance(G,SharedCSRGraph):
+            G=SharedCSRGraph(G,nodes)
+        raw_counts=dict()
+        if pool is not None:
+            # Each task carries the arrays, so the roots are dealt into one task per worker
+            num_chunks=max(min(num_roots,workers or multiprocessing.cpu_count()),1)
+            tasks=[(G._adj,G._succ,G.is_directed(),max_nodes,xrange(i,num_roots,num_chunks)) 
+                for i in xrange(num_chunks)]
+            results=pool.imap_unordered(_esu_task,tasks)
+        else:
+            # Low numbered roots have the most subgraphs, so deal the roots out in strides
+            num_chunks=min(num_roots,8*workers)
+            chunks=[xrange(i,num_roots,num_chunks) for i in xrange(num_chunks)]
+            own_pool=multiprocessing.Pool(workers,_init_csr_worker,(G,max_nodes))
+            results=own_pool.imap_unordered(_esu_worker,chunks)
+        try:
+            for chunk_counts in results:
+                for key,count in chunk_counts.iteritems():
+                    raw_counts[key]=raw_counts.get(key,0)+count
+        finally:
+            if pool is None:
+                own_pool.terminate()
+    else:
+        adj,succ=_adjacency(G,nodes)
+        raw_counts=_esu_roots(xrange(num_roots),adj,succ,G.is_directed(),max_nodes)
+    return _classify(raw_counts,max_nodes,G.is_directed())
+
+
+def _esu_roots(roots, adj, succ, directed, max_nodes):
+    """Returns the counts, keyed by raw adjacency mask, of the subgraphs enumerated by ESU from 
+    each of the given roots"""
+    raw_counts=dict()
+    for root in roots:
+        extension=[u for u in adj[root] if u>root]
+        _esu_extend([root],extension,adj[root]|set([root]),root,0,adj,succ,directed,max_nodes,
+            raw_counts)
+    return raw_counts
+
+
+# State shared by the worker processes of a counting pool, set when each worker starts
+_worker_state=None
+
+def _init_worker(state):
+    global _worker_state
+    _worker_state=state
+    
+
+def _init_csr_worker(G, max_nodes):
+    # The neighbor sets are built in the worker, from the shared arrays, as they are needed
+    _init_worker((G.neighbor_sets(),G.successor_sets(),G.is_directed(),max_nodes))
+    
+
+def _init_vf2_worker(G, anchors):
+    # The index graph is built in the worker, from the shared arrays
+    index_graph=_index_graph(G._succ,G.is_directed())
+    _init_worker((index_graph,dict((i,i) for i in index_graph),anchors))
+    
+
+def _esu_worker(roots):
+    adj,succ,directed,max_nodes=_worker_state
+    return _esu_roots(roots,adj,succ,directed,max_nodes)
+    
+
+def _vf2_worker(motif):
+    G,rank,anchors=_worker_state
+    return _vf2_count(G,motif,rank,anchors)
+    
+
+def _esu_task(task):
+    # A task for a pool started by the caller, carrying the CSR arrays of the graph
+    adj,succ,directed,max_nodes,roots=task
+    adj_sets=_NeighborSets(*adj)
+    succ_sets=_NeighborSets(*succ) if directed else adj_sets
+    return _esu_roots(roots,adj_sets,succ_sets,directed,max_nodes)
+    
+
+def _vf2_task(task):
+    # A task for a pool started by the caller, carrying the CSR arrays and a chunk of motifs
+    succ,directed,anchors,graphs=task
+    G=_index_graph(succ,directed)
+    rank=dict((i,i) for i in G)
+    return [_vf2_count(G,motif,rank,anchors) for motif in graphs]
+
+
+def _index_graph(succ, directed):
+    """Returns a NetworkX graph of the node indices of the CSR arrays (indptr,indices) succ"""
+    indptr,indices=succ
+    G=nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(xrange(len(indptr)-1))
+    for i in xrange(len(indptr)-1):
+        G.add_edges_from((i,j) for j in indices[indptr[i]:indptr[i+1]].tolist())
+    return G
+
+
+def _adjacency(G, nodes):
+    """Returns lists of neighbor sets, ignoring direction, and successor sets for the nodes of G, 
+    in which node nodes[i] is relabeled i.  A SharedCSRGraph is already numbered by the order 
+    of its nodes."""
+    if isinstance(G,SharedCSRGraph):
+        return G.neighbor_sets(),G.successor_sets()
+    index=dict((v,i) for i,v in enumerate(nodes))
+    if G.is_directed():
+        succ=[set(index[u] for u in G.successors_iter(v)) for v in nodes]
+        adj=[succ[i]|set(index[u] for u in G.predecessors_iter(v)) for i,v in enumerate(nodes)]
+    else:
+        adj=[set(index[u] for u in G.neighbors_iter(v)) for v in nodes]
+        succ=adj
+    for i in xrange(len(nodes)):
+        adj[i].discard(i)
+    return adj,succ
+
+
+def _networkx(G):
+    """Returns G as a NetworkX graph"""
+    if isinstance(G,SharedCSRGraph):
+        return G.to_networkx()
+    return G
+
+
+def _adjacency_matrix(G):
+    """Returns the sparse adjacency matrix of G, with entries of one and no self loops"""
+    if isinstance(G,SharedCSRGraph):
+        return G.adjacency_matrix()
+    nodes=G.nodes()
+    index=dict((v,i) for i,v in enumerate(nodes))
+    arcs=[(index[u],index[v]) for (u,v) in G.edges_iter() if u!=v]
+    if not G.is_directed():
+        arcs+=[(v,u) for (u,v) in arcs]
+    A=sparse.csr_matrix((ones(len(arcs),dtype=int),([u for (u,v) in arcs],[v for (u,v) in arcs])),
+        shape=(len(nodes),len(nodes)),dtype=int)
+    A.data[:]=1     # Collapse any repeated edges
+    return A
+
+
+def _classify(raw_counts, max_nodes, directed):
+    """Converts counts keyed by raw adjacency mask, as recorded by _esu_extend, to counts keyed 
+    by canonical code"""
+    occurrences=dict()
+    for (n,mask),count in raw_counts.iteritems():
+        code=(n,canonical_code(n,_narrow(mask,max_nodes,n),directed))
+        occurrences[code]=occurrences.get(code,0)+count
+    return occurrences
+
+
+def _esu_extend(subgraph, extension, closed, root, mask, adj, succ, directed, max_nodes, raw_counts):
+    """Recursive step of ESU: records the current subgraph by its raw adjacency mask, then
+    extends it by each node of the extension set in turn.  Masks are encoded with a row
+    width of max_nodes while the subgraph grows."""
+    n=len(subgraph)
+    if n>1:
+        key=(n,mask)
+        raw_counts[key]=raw_counts.get(key,0)+1
+    if n==max_nodes:
+        return
+    extension=list(extension)
+    while extension:
+        w=extension.pop()
+        new_extension=extension+[u for u in adj[w] if u>root and u not in closed]
+        # Add the edges between w and the subgraph to the mask
+        new_mask=mask
+        for i,v in enumerate(subgraph):
+            if directed:
+                if w in succ[v]:
+                    new_mask|=1<<(i*max_nodes+n)
+                if v in succ[w]:
+                    new_mask|=1<<(n*max_nodes+i)
+            elif v in adj[w]:
+                new_mask|=1<<(i*max_nodes+n)
+        _esu_extend(subgraph+[w],new_extension,closed|adj[w],root,new_mask,adj,succ,directed,
+            max_nodes,raw_counts)
+
+
+def _rand_esu_extend(subgraph, extension, closed, weight, adj, succ, directed, max_nodes, raw_counts,
+    fraction, rng):
+    """Recursive step of a RAND-ESU enumeration of the subgraphs containing subgraph[0], in 
+    which each extension of a subgraph of two or more nodes is followed with probability 
+    fraction.  Subgraphs are recorded with the inverse of the probability of reaching them."""
+    n=len(subgraph)
+    if n>1:
+        mask=0
+        for i in xrange(n):
+            for j in xrange(n):
+                if i!=j and (directed or i<j) and subgraph[j] in succ[subgraph[i]]:
+                    mask|=1<<(i*max_nodes+j)
+        key=(n,mask)
+        raw_counts[key]=raw_counts.get(key,0)+weight
+    if n==max_nodes:
+        return
+    extension=list(extension)
+    p=fraction if n>1 else 1.0
+    while extension:
+        w=extension.pop()
+        if p<1 and rng.uniform()>=p:
+            continue
+        new_extension=extension+[u for u in adj[w] if u not in closed]
+        _rand_esu_extend(subgraph+[w],new_extension,closed|adj[w],weight/p,adj,succ,directed,
+            max_nodes,raw_counts,fraction,rng)
+
+
+def _narrow(mask, width, n):
+    """Re-encodes an adjacency bitmask with rows of the given width as a bitmask on n nodes"""
+    narrowed=0
+    for i in xrange(n):
+        row=(mask>>(i*width))&((1<<n)-1)
+        narrowed|=row<<(i*n)
+    return narrowed
+
+
+def matrix_counts(G, motifs, anchors=None, occurrences=False):
+    """
+    Counts undirected motifs of up to four nodes, or directed motifs of up to three nodes, 
+    without any subgraph matching.  For undirected motifs the number of (not necessarily 
+    induced) copies of each motif is computed from the degree sequence and products of the 
+    sparse adjacency matrix A, e.g. sum(C(d,2)) paths of length two and trace(A^3)/6 triangles, 
+    and these are converted to counts of induced subgraphs by subtracting the copies contained 
+    in every denser motif on the same nodes.  For directed motifs a triad census is computed 
+    from products of the matrices of mutual, outgoing and incoming ties.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a SharedCSRGraph.
+
+    motifs : A list of tuples of the construct (index,motif,count), as returned by get_motifs.
+
+    anchors : An optional list of nodes in G.  If given, only subgraphs that contain at least
+        one of the anchor nodes are counted, found as the difference between the counts in G 
+        and in G with the anchor nodes removed.
+        
+    occurrences : A boolean, as in vf2_counts.
+
+    Returns
+    ----------
+    counts : A list of counts for each motif, in the order of motifs.
+    """
+    codes=[graph_code(b) for (a,b,c) in motifs]
+    max_nodes=max([n for (n,mask) in codes])
+    if max_nodes>(3 if G.is_directed() else 4):
+        raise ValueError("Closed form motif counts are only available for undirected motifs of up to four nodes, or directed motifs of up to three nodes")
+    if anchors is not None:
+        G=_networkx(G)
+        anchors=set(anchors)
+        remainder=G.subgraph([v for v in G if v not in anchors])
+        return [a-b for a,b in zip(matrix_counts(G,motifs,None,occurrences),
+            matrix_counts(remainder,motifs,None,occurrences))]
+    if G.is_directed():
+        found=_triad_census(G)
+    else:
+        copies=_subgraph_copies(G,max_nodes)
+        found=dict()
+        # Work down from the densest motifs, removing the copies found inside denser induced subgraphs
+        for code in sorted(copies,key=lambda c: -_mask_size(c[1])):
+            found[code]=copies[code]-sum([_containment(code,denser)*count for denser,count in found.iteritems()
+                if denser[0]==code[0]])
+    counts=[int(found.get(code,0)) for code in codes]
+    if occurrences:
+        return counts
+    return _scale_counts(counts,motifs,G.is_directed())
+
+
+# Named motifs whose non-induced copies are counted by _subgraph_copies
+_closed_form_motifs=dict([
+    ("edge",nx.complete_graph(2)),("wedge",nx.path_graph(3)),("triangle",nx.complete_graph(3)),
+    ("star",nx.star_graph(3)),("path",nx.path_graph(4)),("cycle",nx.cycle_graph(4)),
+    ("paw",nx.Graph(data=[(0,1),(1,2),(0,2),(2,3)])),
+    ("diamond",nx.Graph(data=[(0,1),(1,2),(0,2),(1,3),(2,3)])),("clique",nx.complete_graph(4))])
+
+def _subgraph_copies(G, max_nodes):
+    """Returns the number of (not necessarily induced) copies of each connected graph with up 
+    to max_nodes<=4 nodes in G, keyed by canonical code"""
+    A=_adjacency_matrix(G)
+    degree=asarray(A.sum(axis=1)).ravel()
+    copies={"edge":A.nnz//2}
+    if max_nodes>=3:
+        A2=A.dot(A).tocsr()
+        common=A2.multiply(A).tocsr()       # Common neighbors of the endpoints of each edge
+        triangles=common.sum()//6
+        copies["wedge"]=_choose(degree,2).sum()
+        copies["triangle"]=triangles
+    if max_nodes>=4:
+        node_triangles=asarray(common.sum(axis=1)).ravel()//2
+        copies["star"]=_choose(degree,3).sum()
+        copies["path"]=A.dot(degree-1).dot(degree-1)//2-3*triangles
+        copies["cycle"]=(_choose(A2.data,2).sum()-_choose(A2.diagonal(),2).sum())//4
+        copies["paw"]=(node_triangles*(degree-2)).sum()
+        copies["diamond"]=_choose(common.data,2).sum()//2
+        copies["clique"]=_cliques(A,degree)
+    return dict((graph_code(_closed_form_motifs[name]),count) for name,count in copies.iteritems())
+    
+
+def _triad_census(G):
+    """
+    Returns the number of occurrences of each connected directed graph with two or three 
+    nodes in G, keyed by canonical code.  Every tie from a node u to a node v is of one type: 
+    mutual, out (u->v only) or in (v->u only), with sparse matrices M, O and I=O^T.  Closed 
+    triads are counted as closed walks u,v,w over typed ties, sum((X.Y)*Z^T), and open triads 
+    by their center v and the types of its ties to each end, less the pairs of ends that are 
+    adjacent, sum((X.U)*Y) for the skeleton U=M+O+I.  Each pattern of tie types is classified 
+    by building the triad it describes.
+    """
+    A=_adjacency_matrix(G)
+    M=A.multiply(A.T).tocsr()
+    O=(A-M).tocsr()
+    O.eliminate_zeros()
+    ties={"mutual":M,"out":O,"in":O.T.tocsr()}
+    U=(M+O+ties["in"]).tocsr()
+    census=dict()
+    def add(code, count):
+        census[code]=census.get(code,0)+count
+    add(graph_code(nx.DiGraph(data=[(0,1),(1,0)])),M.nnz//2)
+    add(graph_code(nx.DiGraph(data=[(0,1)])),O.nnz)
+    degree=dict((t,asarray(X.sum(axis=1)).ravel()) for t,X in ties.iteritems())
+    triads=dict()
+    for t1,X in ties.iteritems():
+        XU=X.dot(U)
+        for t2,Y in ties.iteritems():
+            # Open triads, center 0 tied to 1 and 2; each is found once for each ordering of its ends
+            pairs=degree[t1].dot(degree[t2])
+            if t1==t2:
+                pairs-=degree[t1].sum()
+            code=graph_code(_typed_triad([(0,1,t1),(0,2,t2)]))
+            triads[code]=triads.get(code,0)+3*(pairs-XU.multiply(Y).sum())
+            # Closed triads, each found once for each of the six walks around it
+            XY=X.dot(Y)
+            for t3,Z in ties.iteritems():
+                code=graph_code(_typed_triad([(0,1,t1),(1,2,t2),(2,0,t3)]))
+                triads[code]=triads.get(code,0)+XY.multiply(Z.T).sum()
+    for code,count in triads.iteritems():
+        add(code,count//6)
+    return census
+    
+
+def _typed_triad(ties):
+    """Returns the three node DiGraph described by a list of (u,v,type) ties"""
+    D=nx.DiGraph()
+    D.add_nodes_from([0,1,2])
+    for u,v,t in ties:
+        if t!="in":
+            D.add_edge(u,v)
+        if t!="out":
+            D.add_edge(v,u)
+    return D
+
+
+def _cliques(A, degree):
+    """Returns the number of four node cliques in the graph with adjacency matrix A, orienting 
+    each edge towards the node of higher degree and intersecting out-neighborhoods"""
+    rank=sorted(xrange(len(degree)),key=lambda v: (degree[v],v))
+    position=dict((v,i) for i,v in enumerate(rank))
+    out=[set() for v in xrange(len(degree))]
+    rows,cols=A.nonzero()
+    for u,v in zip(rows,cols):
+        if position[u]<position[v]:
+            out[u].add(v)
+    count=0
+    for u in xrange(len(degree)):
+        for v in out[u]:
+            common=out[u]&out[v]
+            for w in common:
+                count+=len(common&out[w])
+    return count
+
+
+def _choose(x, k):
+    """Vectorized binomial coefficient C(x,k) for k of two or three"""
+    x=asarray(x,dtype=int)
+    if k==2:
+        return x*(x-1)//2
+    return x*(x-1)*(x-2)//6
+    
+
+def _mask_size(mask):
+    """Returns the number of edges in an adjacency bitmask"""
+    return bin(mask).count("1")
+
+
+# Memoized numbers of copies of one motif inside another, keyed by pairs of canonical codes
+_containment_cache=dict()
+
+def _containment(code, denser):
+    """Returns the number of spanning subgraphs of the undirected motif with canonical code 
+    denser that are isomorphic to the motif with canonical code code"""
+    key=(code,denser)
+    if key not in _containment_cache:
+        n=denser[0]
+        edges=[(i,j) for i in xrange(n) for j in xrange(i+1,n) if denser[1]>>(i*n+j)&1]
+        count=0
+        for subset in itertools.combinations(edges,_mask_size(code[1])):
+            mask=sum([1<<(i*n+j) for (i,j) in subset])
+            if canonical_code(n,mask,False)==code[1]:
+                count+=1
+        _containment_cache[key]=count
+    return _containment_cache[key]
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,203 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+delta.py
+
+Purpose:  Records of the nodes and edges added to the base structure of a Graph Motif Model by
+          one application of a growth rule, and the step records published by simulations.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["GraphDelta","StepRecord","graph_delta"]
+__docformat__ = "restructuredtext en"
+
+import collections
+
+# The changes made by one step of a simulation: the step number, the index of the motif drawn, and
+# tuples of the nodes and edges added and removed
+StepRecord=collections.namedtuple("StepRecord",["step","motif","nodes","edges","removed_nodes",
+    "removed_edges"])
+
+class GraphDelta(object):
+    """
+    Builds the nodes and edges to be added to a base graph without copying it.  An in-place
+    growth rule, see gmm.set_rule, is given a GraphDelta over the live base structure of the
+    model; it reads the base through the base attribute, which must not be changed, and records
+    its additions with the methods below.  The model then adds them to the base in place with
+    apply, so each step costs time in the size of the addition rather than of the base.
+
+    Parameters
+    ----------
+    base : The NetworkX Graph or DiGraph object the additions are made to.
+
+    next_node : An optional integer from which new nodes are numbered.  If None it is found from
+        the largest integer node of the base.
+
+    model : An optional gmm object whose new_nodes method numbers the new nodes in place of
+        next_node, so that labels taken from the model and from the delta by one rule are never
+        the same.
+
+    Examples
+    ----------
+    >>> def rand_add(delta, new, rng):
+       ...:     nodes=delta.add_graph(new)
+       ...:     delta.add_edge(rng.randint(delta.base.number_of_nodes()),nodes[rng.randint(len(nodes))])
+    >>> model.set_rule(rand_add,inplace=True)
+    
+    Notes
+    -----
+    The removed_nodes and removed_edges lists are only filled by graph_delta, as in-place rules 
+    can only add to the base.
+    """
+    def __init__(self, base, next_node=None, model=None):
+        self.base=base
+        self.nodes=list()
+        self.edges=list()
+        self.removed_nodes=list()
+        self.removed_edges=list()
+        self._next_node=next_node
+        self._integer_nodes=None
+        self._model=model
+
+    def __len__(self):
+        return len(self.nodes)+len(self.edges)
+
+    def __repr__(self):
+        return "GraphDelta(%d nodes, %d edges)" % (len(self.nodes),len(self.edges))
+
+    def add_node(self, n):
+        """Records node n to be added"""
+        self.nodes.append(n)
+        if not isinstance(n,int):
+            return
+        if self._model is not None:
+            self._model.next_node=max(self._model.next_node,n+1)
+        elif self._next_node is not None:
+            self._next_node=max(self._next_node,n+1)
+
+    def add_nodes_from(self, nodes):
+        """Records each node in nodes to be added"""
+        for n in nodes:
+            self.add_node(n)
+
+    def add_edge(self, u, v, attr_dict=None, **attr):
+        """Records an edge from u to v to be added, with an optional dictionary of attributes.
+        Nodes of the edge that are not yet in the base are added with it."""
+        if attr_dict is not None or attr:
+            data=dict(attr_dict or {})
+            data.update(attr)
+            self.edges.append((u,v,data))
+        else:
+            self.edges.append((u,v))
+
+    def add_edges_from(self, edges):
+        """Records each edge in edges, as (u,v) or (u,v,attributes) tuples, to be added"""
+        for e in edges:
+            self.add_edge(*e)
+
+    def new_node(self):
+        """Records and returns a new integer node, one greater than any integer node in the base
+        or the delta"""
+        if self._model is not None:
+            n=self._model.new_nodes(1)[0]
+        else:
+            n=self.next_node()
+        self.add_node(n)
+        return n
+
+    def next_node(self):
+        """Returns the integer node that new_node would add next"""
+        if self._model is not None:
+            while self._model.next_node in self.base:
+                self._model.next_node+=1
+            return self._model.next_node
+        if self._next_node is None:
+            labels=[n for n in self.base if isinstance(n,int)]+[n for n in self.nodes if isinstance(n,int)]
+            self._next_node=max(labels)+1 if labels else 0
+        # Nodes given to the base since the counter was set are skipped
+        while self._next_node in self.base:
+            self._next_node+=1
+        return self._next_node
+
+    def integer_nodes(self):
+        """Returns the number of nodes of the base labeled by non-negative integers, kept by the 
+        model if there is one and otherwise found once from the base"""
+        if self._model is not None:
+            return self._model.integer_nodes
+        if self._integer_nodes is None:
+            self._integer_nodes=sum(1 for n in self.base if isinstance(n,int) and n>=0)
+        return self._integer_nodes
+
+    def add_graph(self, new):
+        """Records the nodes and edges of the graph new, relabeled to new integer nodes in the order
+        of new.nodes(), and returns the list of their labels"""
+        labels=dict((u,self.new_node()) for u in new.nodes())
+        self.add_edges_from((labels[u],labels[v]) for u,v in new.edges_iter())
+        return [labels[u] for u in new.nodes()]
+
+    def apply(self, G=None):
+        """Adds the recorded nodes and edges to G in place, which defaults to the base, and returns
+        G.  Nodes and edges already in G, or recorded twice, are skipped, and the nodes and edges
+        lists are left holding only the additions that were new to G, including the nodes of new
+        edges."""
+        if G is None:
+            G=self.base
+        nodes=list()
+        seen=set()
+        for n in self.nodes:
+            if n not in G and n not in seen:
+                seen.add(n)
+                nodes.append(n)
+        edges=list()
+        pairs=set()
+        for e in self.edges:
+            u,v=e[0],e[1]
+            pair=(u,v) if G.is_directed() else frozenset((u,v))
+            if pair in pairs or G.has_edge(u,v):
+                continue
+            pairs.add(pair)
+            edges.append(e)
+            for w in (u,v):
+                if w not in G and w not in seen:
+                    seen.add(w)
+                    nodes.append(w)
+        G.add_nodes_from(nodes)
+        G.add_edges_from(edges)
+        self.nodes,self.edges=nodes,edges
+        return G
+
+    def record(self, step, motif):
+        """Returns the StepRecord of this delta, as the given step drawing the given motif index"""
+        return StepRecord(step,motif,tuple(self.nodes),tuple((e[0],e[1]) for e in self.edges),
+            tuple(self.removed_nodes),tuple(self.removed_edges))
+
+
+def graph_delta(old, new):
+    """
+    Returns the GraphDelta over old of the changes that turn the graph old into the graph new,
+    found by comparing every node and edge of the two graphs.
+
+    Parameters
+    ----------
+    old : A NetworkX Graph or DiGraph object.
+
+    new : A NetworkX graph of the same type, such as the result of a growth rule applied to old.
+
+    Returns
+    ----------
+    delta : A GraphDelta whose nodes and edges are those in new but not old, and whose
+        removed_nodes and removed_edges are those in old but not new.
+    """
+    delta=GraphDelta(old)
+    delta.nodes=[n for n in new if n not in old]
+    delta.edges=[(u,v) for u,v in new.edges_iter() if not old.has_edge(u,v)]
+    delta.removed_nodes=[n for n in old if n not in new]
+    delta.removed_edges=[(u,v) for u,v in old.edges_iter() if not new.has_edge(u,v)]
+    return delta
+
+
+if __name__ == '__main__':
+    pass
@@ -0,0 +1,160 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+distribution.py
+
+Purpose:  Motif counts and the probability masses estimated from them, held in NumPy arrays
+          alongside the motif set of a Graph Motif Model.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["MotifDistribution"]
+__docformat__ = "restructuredtext en"
+
+from numpy import arange, asarray, random
+from scipy import stats
+from sampling import AliasSampler, _search_cumulative
+
+class MotifDistribution(object):
+    """
+    The counts of a set of motifs in a base structure, and optionally a probability mass for
+    each motif estimated from the counts.  The motifs are held as a tuple, which is the same
+    object as the motif set of gmm.algorithms.motif_cache when built by simulate, and the counts
+    and masses as contiguous NumPy arrays in the same order.  Estimators return a new
+    distribution sharing the motifs and counts, so a distribution is never changed once built.
+
+    Parameters
+    ----------
+    motifs : A sequence of gmm.motifs.Motif objects, as returned by motif_cache.get.
+
+    counts : A sequence of the count of each motif.
+
+    mass : An optional sequence of the probability mass of each motif.
+
+    Examples
+    ----------
+    >>> dist=MotifDistribution(motif_cache.get(3,False),[12,5,2])
+    >>> dist.count_ratio().mass
+    array([ 0.63157895,  0.26315789,  0.10526316])
+    """
+    def __init__(self, motifs, counts, mass=None):
+        self.motifs=tuple(motifs)
+        self.counts=asarray(counts)
+        if len(self.counts)!=len(self.motifs):
+            raise ValueError("There must be one count for each motif")
+        self.mass=None if mass is None else asarray(mass,dtype=float)
+
+    @classmethod
+    def from_list(cls, motif_list):
+        """Returns the distribution of the counts in a list of (index,motif,count) tuples, as
+        returned by motif_counts"""
+        return cls([(b) for (a,b,c) in motif_list],[(c) for (a,b,c) in motif_list])
+
+    def to_list(self):
+        """Returns a list of (index,motif,value) tuples, where value is the probability mass of
+        each motif if it has been estimated and its count otherwise"""
+        values=self.counts if self.mass is None else self.mass
+        return [(i,m,v) for i,(m,v) in enumerate(zip(self.motifs,values.tolist()))]
+
+    def __len__(self):
+        return len(self.motifs)
+
+    def __repr__(self):
+        return "MotifDistribution(%d motifs, %s)" % (len(self),"counts" if self.mass is None else "mass")
+
+    def poisson(self):
+        """Returns a distribution with the Poisson probability mass of each motif, whose mean is
+        the index of the most frequent motif, see gmm.algorithms.poisson_mass"""
+        mu=int(self.counts.argmax())
+        return MotifDistribution(self.motifs,self.counts,_poisson_pmf(mu,len(self)))
+
+    def count_ratio(self):
+        """Returns a distribution with the mass of each motif proportional to its count"""
+        total=self.counts.sum()
+        if total<=0:
+            raise ValueError("Count ratios need at least one motif with a positive count")
+        return MotifDistribution(self.motifs,self.counts,self.counts/float(total))
+
+    def smoothed(self, alpha=1.0):
+        """Returns a distribution with the mass of each motif proportional to its count plus
+        alpha, so that motifs absent from the base structure keep a positive mass"""
+        if alpha<0:
+            raise ValueError("The smoothing constant must be non-negative")
+        weights=self.counts+float(alpha)
+        return MotifDistribution(self.motifs,self.counts,weights/weights.sum())
+
+    def estimate(self, estimator="poisson", **options):
+        """Returns a distribution with the mass estimated by the named estimator, one of
+        "poisson", "ratio" or "smoothed", given the keyword options of that estimator"""
+        try:
+            method=_estimators[estimator]
+        except KeyError:
+            raise ValueError("Unknown motif mass estimator: "+str(estimator))
+        return method(self,**options)
+
+    def sampler(self, rng=None):
+        """Returns a gmm.sampling.AliasSampler drawing motif indices in proportion to the mass"""
+        return AliasSampler(self._check_mass(),rng)
+
+    def draw(self, size=None, sampler=None, rng=None):
+        """
+        Draws motifs in proportion to their probability mass.
+
+        Parameters
+        ----------
+        size : An optional number of independent draws.  If given, an array of the drawn motif
+            indices is returned rather than a motif.
+
+        sampler : An optional AliasSampler of the mass, see sampler, which is reused for the
+            draws.  If None, a single draw builds an alias table and an array of draws searches
+            the cumulative mass.
+
+        rng : A NumPy RandomState used for the draws when no sampler is given, defaults to the
+            global NumPy state.
+
+        Returns
+        ----------
+        motif : A gmm.motifs.Motif, or an array of size motif indices if size is given
+        """
+        mass=self._check_mass()
+        if rng is None:
+            rng=random
+        if size is None:
+            if sampler is None:
+                sampler=AliasSampler(mass,rng)
+            return self.motifs[sampler.draw()]
+        if sampler is not None:
+            return sampler.draw(size)
+        return _search_cumulative(mass.cumsum(),size,rng)
+
+    def _check_mass(self):
+        """Returns the mass, raising a ValueError if it has not been estimated"""
+        if self.mass is None:
+            raise ValueError("The motif mass must be estimated before drawing, e.g. with poisson()")
+        return self.mass
+
+
+# Motif mass estimators by name
+_estimators={"poisson":MotifDistribution.poisson,"ratio":MotifDistribution.count_ratio,
+    "smoothed":MotifDistribution.smoothed}
+
+# Memoized Poisson PMF vectors, keyed by (mu,number of motifs)
+_pmf_cache=dict()
+
+def _poisson_pmf(mu, num_motifs):
+    """Returns a read-only array of the Poisson probabilities of 0 to num_motifs-1 with mean mu,
+    evaluated by SciPy in a single call the first time they are needed"""
+    key=(mu,num_motifs)
+    try:
+        return _pmf_cache[key]
+    except KeyError:
+        pmf=_pmf_cache[key]=stats.poisson.pmf(arange(num_motifs),mu)
+        pmf.setflags(write=False)
+        return pmf
+
+
+if __name__ == '__main__':
+    pass
@@ -16,7 +16,12 @@ __author__="Drew Conway (drew.conway@nyu.edu)"
 __docformat__ = "restructuredtext en"
 
 import copy
+import inspect
 import networkx as nx
+from delta import GraphDelta
+from motifs import Motif
+from sampling import DegreeSampler, random_state
+from shared import SharedCSRGraph
 
 class gmm(object):
     """
@@ -49,7 +54,23 @@ class gmm(object):
         function that can operate on NetworkX Graph or DiGraph objects.  Function 
         must take exactly two arguments: 1) gmm base structure; 2) new structure 
         to be added, as NetworkX Graph or DiGraph object.  If second argument does 
-        not match first it will be coerced to match.
+        not match first it will be coerced to match.  A rule that also takes an 
+        argument named rng is passed the NumPy RandomState of the model, and should 
+        draw all of its random numbers from it.  A rule that takes an argument 
+        named model is passed the gmm object, e.g. to number new nodes with 
+        relabel_into rather than searching the base for its largest node.
+        
+    seed : int, array_like or NumPy RandomState, optional
+        Seed of the random number stream owned by the model, self.rng, which is used 
+        by simulations of the model unless they are given their own seed.
+        
+    inplace : boolean, optional
+        If True, R is an in-place growth rule.  Its first argument is a GraphDelta over 
+        the live base structure rather than the base itself, and it records the nodes 
+        and edges to add with the delta, or returns them as a NetworkX graph, rather 
+        than returning a new base.  The additions are then made to the base in place, 
+        so the base is not copied at every step.  See set_rule.  Defaults to the inplace 
+        attribute of R, which is set on the rules of gmm.rules, or False.
             
     Notes
     ------
@@ -77,19 +98,28 @@ class gmm(object):
     
     # Next, add a simple random growth rule
     
-    >>> def rand_add(base, new):
-       ...:     from numpy.random import randint
+    >>> def rand_add(base, new, rng):
        ...:     new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
        ...:     new_base=nx.compose(base,new)
-       ...:     base_connector=randint(base.number_of_nodes())
-       ...:     new_connector=randint(min(new.nodes()),max(new.nodes()))
+       ...:     base_connector=rng.randint(base.number_of_nodes())
+       ...:     new_connector=rng.randint(min(new.nodes()),max(new.nodes()))
        ...:     new_base.add_edge(base_connector,new_connector)
        ...:     return new_base
     >>> model.set_rule(rand_add)
     
-    # Run simualation with tau=4 and Poisson density for motifs
+    # Run simualation with tau=4 and Poisson density for motifs, seeding the random
+    # numbers passed to the growth rule
     
-    >>> gmm.algorithms.simulate(model,4)
+    >>> gmm.algorithms.simulate(model,4,seed=12345)
+    
+    # Rules may number new nodes from the counter of the model, which avoids searching 
+    # the base for its largest node and copying the new structure at every step
+    
+    >>> def fast_add(base, new, rng, model):
+       ...:     new_base=base.copy()
+       ...:     new_nodes=model.relabel_into(new_base,new)
+       ...:     new_base.add_edge(rng.randint(base.number_of_nodes()),new_nodes[0])
+       ...:     return new_base
     
     # View results
     
@@ -98,7 +128,11 @@ class gmm(object):
     
     """
     ### Initialize gmm object
-    def __init__(self, G, T=None,R=None):
+    def __init__(self, G, T=None,R=None,seed=None,inplace=None):
+        self.rng=random_state(seed)
+        self.run_info=None      # Summary of the last simulation, set by algorithms.simulate
+        self.last_delta=None    # GraphDelta applied in place by the last growth step, if any
+        self._degree_sampler=None   # DegreeSampler of the base, built by degree_sampler
         # Degenerate graph for testing gmm growth rule   
         self.test_graph=nx.Graph(data=[(0,1),(1,2)])           # Dyad
         self.am_gmm=True
@@ -108,6 +142,8 @@ class gmm(object):
                 G=nx.convert_node_labels_to_integers(G,discard_old_labels=False)
                 self.base=G
                 self.original=copy.deepcopy(G)  # copy of graph to remain unaltered by simulations
+                self.next_node=_next_node(G)    # Next integer node label, kept by apply_rule
+                self.integer_nodes=_integer_nodes(G)    # Number of non-negative integer labels
             else:
                 raise ValueError("Base graph must have at least two edges")
         else:
@@ -128,15 +164,23 @@ class gmm(object):
             self.termination=None
         # Store optimization rule if passed by user, test that it is compatible with base and takes 
         # NetworkX graph as second argument
+        inplace=_rule_protocol(R,inplace)
+        self.inplace=inplace
         if R is not None:
             try:
-                R(self.base,self.test_graph)
+                arguments=_rule_arguments(R)
+                model=self._test_model()
+                _call_rule(R,arguments,_rule_base(self.base,inplace,model),self.test_graph,
+                    random_state(0),model)
                 self.rule=R
+                self.rule_arguments=arguments
             except TypeError:
                 print("R must be a function compatible with NetworkX graph objects, growth rule set to None.")
                 self.rule=None
+                self.rule_arguments=frozenset()
         else:
             self.rule=None
+            self.rule_arguments=frozenset()
             
     ### gmm support functions    
     def get_base(self, original=False):
@@ -150,12 +194,20 @@ class gmm(object):
         else:
             return self.base
         
+    def shared_base(self):
+        """Returns the current base graph as a SharedCSRGraph, whose compressed sparse row arrays 
+        are held in shared memory and can be read by counting worker processes without copying"""
+        return SharedCSRGraph(self.base)
+        
     def set_base(self, G):
         """Set new base graph for gmm, but does not alter original copy"""
         if type(G)==type(nx.Graph()) or type(G)==type(nx.DiGraph()):
             if(G.number_of_edges()>1):
                 G=nx.convert_node_labels_to_integers(G,discard_old_labels=False)
                 self.base=G
+                self.next_node=_next_node(G)
+                self.integer_nodes=_integer_nodes(G)
+                self._degree_sampler=None
             else:
                 ValueError("Base graph must have at least two edges")
         else:
@@ -164,6 +216,39 @@ class gmm(object):
     def revert_base(self):
         """Reverts base graph to initial structure"""
         self.base=copy.deepcopy(self.original)
+        self.next_node=_next_node(self.base)
+        self.integer_nodes=_integer_nodes(self.base)
+        self._degree_sampler=None
+        
+    def degree_sampler(self):
+        """Returns a gmm.sampling.DegreeSampler of the base graph, which draws nodes with 
+        probability proportional to their degree in logarithmic time, as preferential 
+        attachment rules do.  It is built on first use and kept up to date by apply_rule 
+        with the additions of in-place rules; a base replaced by any other rule is sampled 
+        by a new sampler, built the next time one is asked for."""
+        if self._degree_sampler is None:
+            self._degree_sampler=DegreeSampler(self.base,self.rng)
+        return self._degree_sampler
+        
+    def new_nodes(self, k=1):
+        """Returns a list of k integer node labels not used by the base graph, numbered on from 
+        self.next_node, which is advanced past them.  Labels are never handed out twice, so 
+        structure added under them does not collide with the base or with other new structure."""
+        nodes=list()
+        while len(nodes)<k:
+            if self.next_node not in self.base:
+                nodes.append(self.next_node)
+            self.next_node+=1
+        return nodes
+        
+    def relabel_into(self, G, new):
+        """Adds the nodes and edges of the graph new to the graph G under new integer labels from 
+        new_nodes, without copying new, and returns the list of labels in the order of 
+        new.nodes().  G is typically a copy of the base graph that a growth rule will return."""
+        labels=dict(zip(new.nodes(),self.new_nodes(new.number_of_nodes())))
+        G.add_nodes_from(labels.itervalues())
+        G.add_edges_from((labels[u],labels[v]) for u,v in new.edges_iter())
+        return [labels[u] for u in new.nodes()]
     
     def set_termination(self, T):
         """Set the termination rule"""
@@ -177,17 +262,41 @@ class gmm(object):
         """Applies the termination rule to the current base graph"""
         return self.termination(self.base)
     
-    def set_rule(self, R):
-        """Set growth function"""
+    def set_rule(self, R, inplace=None):
+        """Set growth function
+        
+        If inplace is True, R is an in-place growth rule, called as R(delta,new) with a GraphDelta 
+        over the live base graph.  The rule reads the base from delta.base without changing it, 
+        and records the nodes and edges to add with the delta or returns them as a NetworkX 
+        graph, labeled as they are to appear in the base.  Otherwise R returns a new base graph.  
+        If inplace is None it is taken from the inplace attribute of R, which is set on the rules 
+        of gmm.rules, or is False.
+        """
+        inplace=_rule_protocol(R,inplace)
         try:
-            R(self.base,self.test_graph)
+            arguments=_rule_arguments(R)
+            model=self._test_model()
+            _call_rule(R,arguments,_rule_base(self.base,inplace,model),self.test_graph,
+                random_state(0),model)
             self.rule=R
+            self.rule_arguments=arguments
+            self.inplace=inplace
         except TypeError:
             print("R must be a function compatible with NetworkX graph objects, no change made.")
             
-    def apply_rule(self,new,set_result=False):
+    def apply_rule(self,new,set_result=False,rng=None):
         """Applies the growth rule to the current base graph with some new structure. If set_result is
-        True then set base graph to result of rule application"""
+        True then set base graph to result of rule application.  A Motif, as drawn by 
+        draw_structure, is converted to a NetworkX graph before the rule is applied.  If the rule 
+        takes an rng argument it is passed rng, or the RandomState of the model if rng is None.
+        
+        The additions of an in-place rule are made to the base graph itself if set_result is True, 
+        and to a copy of it otherwise.  After a rule is applied, self.last_delta holds the 
+        GraphDelta of the additions made to the base in place, or None if the base was not 
+        changed in place, and self.next_node has been advanced past the largest integer node 
+        added, whether or not the labels added were contiguous."""
+        if isinstance(new,Motif):
+            new=new.to_networkx()
         # Graph types must match, do coercion step if necessary
         try:
             if self.base.is_directed() is True and new.is_directed() is False:
@@ -198,17 +307,94 @@ class gmm(object):
         except TypeError:
             raise TypeError("New graph structure not a NetworkX Graph or DiGraph object")
         # Apply rule
+        if self.inplace:
+            # The delta numbers new nodes with new_nodes, so the rule may take labels from either
+            delta=GraphDelta(self.base,model=self)
+            added=_call_rule(self.rule,self.rule_arguments,delta,new,self.rng if rng is None else rng,self)
+            if added is not None and added is not delta:
+                delta.add_nodes_from(added.nodes())
+                delta.add_edges_from(added.edges(data=True))
+            if set_result is True:
+                self.last_delta=delta
+                result=delta.apply()
+                self.integer_nodes+=_integer_nodes(delta.nodes)
+                self.next_node=max(self.next_node,_next_node(delta.nodes))
+                if self._degree_sampler is not None:
+                    self._degree_sampler.update(delta)
+                return result
+            self.last_delta=None
+            return delta.apply(self.base.copy())
+        self.last_delta=None
+        result=_call_rule(self.rule,self.rule_arguments,self.base,new,self.rng if rng is None else rng,self)
         if set_result is True:
-            self.base=self.rule(self.base,new)
-            return self.base
-        else:
-            return self.rule(self.base,new)
+            self.base=result
+            self._degree_sampler=None
+            self.integer_nodes=_integer_nodes(result)
+            # Rules may number new nodes from any offset, so the counter is found from the result
+            self.next_node=max(self.next_node,_next_node(result))
+        return result
             
     def am_gmm(self):
         """Simple function to test if object is a gmm"""
         return self.am_gmm
+        
+    def _test_model(self):
+        """Returns a shallow copy of this model passed to growth rules when they are checked, so 
+        that labels they take from new_nodes are not used up"""
+        return copy.copy(self)
             
 
+def _rule_protocol(R, inplace):
+    """Returns whether R is an in-place growth rule, given inplace or else the inplace attribute 
+    of R"""
+    if inplace is None:
+        return getattr(R,"inplace",False)
+    return inplace
+
+
+def _rule_base(base, inplace, model=None):
+    """Returns the first argument of a growth rule, which is a GraphDelta over base numbering new 
+    nodes from model for in-place rules, and base itself otherwise"""
+    if inplace:
+        return GraphDelta(base,model=model)
+    return base
+
+
+def _next_node(G):
+    """Returns one more than the largest integer node of G, or of a list of nodes, or 0 if it 
+    has none"""
+    labels=[n for n in G if isinstance(n,int)]
+    return max(labels)+1 if labels else 0
+
+
+def _integer_nodes(nodes):
+    """Returns the number of nodes, of a graph or in a list, labeled by non-negative integers"""
+    return sum(1 for n in nodes if isinstance(n,int) and n>=0)
+
+
+def _rule_arguments(R):
+    """Returns the set of the optional arguments rng and model that growth rule R accepts, found 
+    once when the rule is set rather than at every step"""
+    try:
+        args,varargs,keywords,defaults=inspect.getargspec(R)
+    except TypeError:
+        return frozenset()
+    if keywords is not None:
+        return frozenset(["rng","model"])
+    return frozenset(a for a in ("rng","model") if a in args)
+
+
+def _call_rule(R, arguments, base, new, rng, model=None):
+    """Applies growth rule R to base and new, passing rng and model if they are among the 
+    arguments R accepts, see _rule_arguments"""
+    options=dict()
+    if "rng" in arguments:
+        options["rng"]=rng
+    if "model" in arguments and model is not None:
+        options["model"]=model
+    return R(base,new,**options)
+    
+
 if __name__ == '__main__':
     # Create most basic GMM object with five node cycle graph as base.
     
@@ -230,12 +416,11 @@ if __name__ == '__main__':
     
     # Finally, add a simple random growth rule
     
-    def rand_add(base, new):
-        from numpy.random import randint
+    def rand_add(base, new, rng):
         new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
         new_base=nx.compose(base,new)
-        base_connector=randint(base.number_of_nodes())
-        new_connector=randint(min(new.nodes()),max(new.nodes()))
+        base_connector=rng.randint(base.number_of_nodes())
+        new_connector=rng.randint(min(new.nodes()),max(new.nodes()))
         new_base.add_edge(base_connector,new_connector)
         return new_base
     
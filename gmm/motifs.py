@@ -0,0 +1,374 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+motifs.py
+
+Purpose:  Canonical labeling of the small graphs used as graph motifs, so that any subgraph
+          of a base structure can be identified with the motif it is isomorphic to.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["Motif","graph_code","graph_mask","canonical_code","automorphisms","automorphism_group",
+    "symmetry_conditions","atlas_codes","connected_codes","code_graph"]
+__docformat__ = "restructuredtext en"
+
+import itertools
+import os
+import networkx as nx
+
+# Memoized canonical forms and automorphism groups, keyed by (num_nodes,mask,directed)
+_canonical_cache=dict()
+_automorphism_cache=dict()
+
+# Atlas of the canonical masks of every connected motif, keyed by (num_nodes,directed); read 
+# from the data file on first use
+_atlas=None
+_atlas_path=os.path.join(os.path.dirname(os.path.abspath(__file__)),"data","atlas.txt")
+_atlas_sizes={False:6,True:4}   # Largest motifs in the atlas, undirected and directed
+
+# Memoized canonical masks of connected graphs larger than those in the atlas
+_connected_cache=dict()
+
+class Motif(object):
+    """
+    A graph motif held as its canonical adjacency bitmask, in which bit i*num_nodes+j is set if
+    there is an edge from node i to node j (for undirected motifs only bits with i<j are used).
+    Motifs hash and compare by canonical code, and are converted to a NetworkX graph only when
+    one is needed, e.g. by a growth rule.
+
+    Parameters
+    ----------
+    num_nodes : The number of nodes in the motif.
+
+    mask : An adjacency bitmask of the motif under any labeling of its nodes.
+
+    directed : A boolean designating whether the motif is directed.
+    """
+    __slots__=("num_nodes","mask","directed")
+
+    def __init__(self, num_nodes, mask, directed):
+        self.num_nodes=num_nodes
+        self.mask=canonical_code(num_nodes,mask,directed)
+        self.directed=bool(directed)
+
+    @classmethod
+    def from_graph(cls, G):
+        """Returns the Motif isomorphic to the NetworkX graph G"""
+        num_nodes,mask=graph_code(G)
+        return cls(num_nodes,mask,G.is_directed())
+
+    @property
+    def code(self):
+        """The canonical code (num_nodes,mask), as returned by graph_code"""
+        return (self.num_nodes,self.mask)
+
+    def number_of_nodes(self):
+        return self.num_nodes
+
+    def number_of_edges(self):
+        return bin(self.mask).count("1")
+
+    def is_directed(self):
+        return self.directed
+
+    def to_networkx(self):
+        """Returns a new NetworkX Graph or DiGraph of the motif on nodes 0 to num_nodes-1"""
+        return code_graph(self.num_nodes,self.mask,self.directed)
+
+    def __hash__(self):
+        return hash((self.num_nodes,self.mask,self.directed))
+
+    def __eq__(self, other):
+        return isinstance(other,Motif) and (self.num_nodes,self.mask,self.directed)==\
+            (other.num_nodes,other.mask,other.directed)
+
+    def __ne__(self, other):
+        return not self==other
+
+    def __reduce__(self):
+        return (Motif,(self.num_nodes,self.mask,self.directed))
+
+    def __repr__(self):
+        return "Motif(%d, %d, %s)" % (self.num_nodes,self.mask,self.directed)
+
+
+def graph_code(G, nodes=None):
+    """
+    Returns the canonical code of a graph, which is equal for two graphs if and only if they
+    are isomorphic.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, or a Motif
+
+    nodes : An optional list of nodes in G; if given, the code is that of the subgraph
+        induced by these nodes.
+
+    Returns
+    ----------
+    code : A tuple (num_nodes,mask), where mask is the adjacency bitmask of the graph under
+        its canonical labeling.
+    """
+    if isinstance(G,Motif):
+        return G.code
+    if nodes is None:
+        nodes=G.nodes()
+    return (len(nodes),canonical_code(len(nodes),graph_mask(G,nodes),G.is_directed()))
+
+
+def graph_mask(G, nodes):
+    """Returns the adjacency bitmask of the subgraph of G induced by the list of nodes, in 
+    which node nodes[i] is labeled i"""
+    directed=G.is_directed()
+    n=len(nodes)
+    mask=0
+    for i in xrange(n):
+        for j in xrange(n):
+            if i!=j and (directed or i<j) and G.has_edge(nodes[i],nodes[j]):
+                mask|=1<<(i*n+j)
+    return mask
+
+
+def canonical_code(num_nodes, mask, directed):
+    """
+    Returns the canonical form of an adjacency bitmask.  Bit i*num_nodes+j of the mask is set
+    if there is an edge from node i to node j; for undirected graphs only bits with i<j are
+    used.  The canonical form is the smallest mask over all relabelings of the nodes that
+    respect a partition of the nodes by degree.
+    """
+    key=(num_nodes,mask,directed)
+    try:
+        return _canonical_cache[key]
+    except KeyError:
+        pass
+    edges=_mask_edges(num_nodes,mask,directed)
+    best=None
+    for order in _orderings(num_nodes,edges,directed):
+        relabeled=_relabel(num_nodes,edges,order,directed)
+        if best is None or relabeled<best:
+            best=relabeled
+    _canonical_cache[key]=best
+    return best
+
+
+def automorphisms(num_nodes, mask, directed):
+    """Returns the number of automorphisms of the graph with the given adjacency bitmask, i.e.
+    the number of times each occurrence of it is found as a subgraph isomorphism"""
+    return len(automorphism_group(num_nodes,mask,directed))
+
+
+def automorphism_group(num_nodes, mask, directed):
+    """Returns the automorphisms of the graph with the given adjacency bitmask as a list of 
+    tuples, in which node v is mapped to node perm[v] by permutation perm"""
+    key=(num_nodes,mask,directed)
+    try:
+        return _automorphism_cache[key]
+    except KeyError:
+        pass
+    edges=_mask_edges(num_nodes,mask,directed)
+    cells=_cells(num_nodes,edges,directed)
+    group=list()
+    for perm in itertools.product(*[itertools.permutations(c) for c in cells]):
+        mapping=dict(zip(itertools.chain(*cells),itertools.chain(*perm)))
+        order=[None]*num_nodes
+        for old,new in mapping.iteritems():
+            order[new]=old
+        if _relabel(num_nodes,edges,order,directed)==mask:
+            group.append(tuple(mapping[v] for v in xrange(num_nodes)))
+    _automorphism_cache[key]=group
+    return group
+
+
+def symmetry_conditions(num_nodes, mask, directed):
+    """
+    Returns a list of symmetry breaking conditions for the graph with the given adjacency 
+    bitmask (Grochow and Kellis, 2007).  Each condition is a pair of nodes (u,v), requiring 
+    that u be matched to a lower ranked node than v.  Of the subgraph isomorphisms that map 
+    the graph onto a given set of nodes, exactly one satisfies every condition.
+    """
+    conditions=list()
+    group=automorphism_group(num_nodes,mask,directed)
+    while len(group)>1:
+        # Fix the first node with a non-trivial orbit, ranking it below the rest of its orbit
+        for v in xrange(num_nodes):
+            orbit=set(perm[v] for perm in group)
+            if len(orbit)>1:
+                break
+        conditions.extend((v,u) for u in sorted(orbit) if u!=v)
+        group=[perm for perm in group if perm[v]==v]
+    return conditions
+
+
+def atlas_codes(num_nodes, directed):
+    """
+    Returns the canonical masks of all connected graphs with the given number of nodes, as
+    stored in the motif atlas shipped with the package, which holds undirected graphs of up to
+    six nodes and directed graphs of up to four nodes.  Masks are ordered by number of edges,
+    then by mask.
+
+    Parameters
+    ----------
+    num_nodes : An integer of at least two.
+
+    directed : A boolean designating whether the graphs should be directed.
+
+    Returns
+    ----------
+    masks : A tuple of canonical masks, or None if the atlas does not hold graphs of this size.
+    """
+    global _atlas
+    if num_nodes<2 or num_nodes>_atlas_sizes[directed]:
+        return None
+    if _atlas is None:
+        atlas=dict()
+        for line in open(_atlas_path):
+            if line.startswith("#") or not line.strip():
+                continue
+            kind,n,mask=line.split()
+            atlas.setdefault((int(n),kind=="d"),[]).append(int(mask,16))
+        _atlas=dict((key,tuple(masks)) for key,masks in atlas.iteritems())
+    return _atlas[(num_nodes,directed)]
+
+
+def code_graph(num_nodes, mask, directed):
+    """Returns a NetworkX Graph or DiGraph on nodes 0 to num_nodes-1 with the edges encoded in an 
+    adjacency bitmask"""
+    G=nx.DiGraph() if directed else nx.Graph()
+    G.add_nodes_from(xrange(num_nodes))
+    G.add_edges_from(_mask_edges(num_nodes,mask,directed))
+    return G
+
+
+def connected_codes(num_nodes, directed):
+    """
+    Returns the canonical masks of all connected graphs with the given number of nodes, exactly 
+    one for each isomorphism class, ordered by number of edges, then by mask.  Sizes held in 
+    the motif atlas are read from it; larger sizes are generated by augmenting the graphs one 
+    node smaller, see _augment, and memoized.
+
+    Parameters
+    ----------
+    num_nodes : An integer of at least two.
+
+    directed : A boolean designating whether the graphs should be directed.
+
+    Returns
+    ----------
+    masks : A tuple of canonical masks.
+    """
+    codes=atlas_codes(num_nodes,directed)
+    if codes is not None:
+        return codes
+    key=(num_nodes,directed)
+    if key not in _connected_cache:
+        if num_nodes<2:
+            raise ValueError("Connected graphs must have at least two nodes")
+        _connected_cache[key]=_augment(connected_codes(num_nodes-1,directed),num_nodes-1,directed)
+    return _connected_cache[key]
+
+
+def _augment(codes, num_nodes, directed):
+    """Returns the sorted canonical masks of the graphs formed by joining a new node to a 
+    connected graph on num_nodes nodes, for each of the given masks and every non-empty set of 
+    edges between the new node and the graph.  Every connected graph has a node whose removal 
+    leaves it connected, so these are all of the connected graphs on num_nodes+1 nodes."""
+    n=num_nodes+1
+    # For each old node i, the choices of edges between it and the new node, labeled num_nodes
+    choices=list()
+    for i in xrange(num_nodes):
+        if directed:
+            out,into=1<<(num_nodes*n+i),1<<(i*n+num_nodes)
+            choices.append([0,out,into,out|into])
+        else:
+            choices.append([0,1<<(i*n+num_nodes)])
+    found=set()
+    for mask in codes:
+        widened=0
+        for i,j in _mask_edges(num_nodes,mask,directed):
+            widened|=1<<(i*n+j)
+        for ties in itertools.product(*choices):
+            if any(ties):
+                found.add(canonical_code(n,widened|sum(ties),directed))
+    return tuple(sorted(found,key=lambda m: (bin(m).count("1"),m)))
+
+
+def _write_atlas(path):
+    """Writes the motif atlas data file: one line per motif of the form "kind nodes mask", where
+    kind is u or d for undirected and directed motifs and mask is the canonical mask in hex"""
+    out=open(path,"w")
+    out.write("# Canonical masks of all connected motifs, generated by python motifs.py\n")
+    for directed in [False,True]:
+        # Start from the connected graphs on two nodes: an edge, and a mutual edge if directed
+        codes=tuple(canonical_code(2,mask,directed) for mask in ([2,6] if directed else [2]))
+        for n in xrange(2,_atlas_sizes[directed]+1):
+            if n>2:
+                codes=_augment(codes,n-1,directed)
+            for mask in codes:
+                out.write("%s %d %x\n" % ("d" if directed else "u",n,mask))
+    out.close()
+
+
+def _mask_edges(num_nodes, mask, directed):
+    """Returns the list of edges encoded in an adjacency bitmask"""
+    edges=list()
+    for i in xrange(num_nodes):
+        for j in xrange(num_nodes):
+            if i!=j and (directed or i<j) and mask>>(i*num_nodes+j)&1:
+                edges.append((i,j))
+    return edges
+
+
+def _relabel(num_nodes, edges, order, directed):
+    """Returns the bitmask of the edges after node order[k] is relabeled k"""
+    position=[0]*num_nodes
+    for k,v in enumerate(order):
+        position[v]=k
+    mask=0
+    for u,v in edges:
+        i,j=position[u],position[v]
+        if not directed and i>j:
+            i,j=j,i
+        mask|=1<<(i*num_nodes+j)
+    return mask
+
+
+def _cells(num_nodes, edges, directed):
+    """Partitions the nodes into cells of equal degree invariants, refined by the invariants
+    of their neighbors, and returns the cells in a labeling independent order"""
+    succ=[set() for v in xrange(num_nodes)]
+    pred=[set() for v in xrange(num_nodes)]
+    for u,v in edges:
+        succ[u].add(v)
+        pred[v].add(u)
+        if not directed:
+            succ[v].add(u)
+            pred[u].add(v)
+    colors=[0]*num_nodes
+    num_colors=1
+    while True:
+        signatures=[(colors[v],tuple(sorted(colors[u] for u in succ[v])),
+            tuple(sorted(colors[u] for u in pred[v]))) for v in xrange(num_nodes)]
+        ranking=dict((s,r) for r,s in enumerate(sorted(set(signatures))))
+        colors=[ranking[s] for s in signatures]
+        if len(ranking)==num_colors:
+            break
+        num_colors=len(ranking)
+    cells=[[] for c in xrange(num_colors)]
+    for v in xrange(num_nodes):
+        cells[colors[v]].append(v)
+    return cells
+
+
+def _orderings(num_nodes, edges, directed):
+    """Yields every node ordering that lists the cells in order, permuting nodes within cells"""
+    cells=_cells(num_nodes,edges,directed)
+    for perm in itertools.product(*[itertools.permutations(c) for c in cells]):
+        yield list(itertools.chain(*perm))
+
+
+if __name__ == '__main__':
+    # Regenerate the motif atlas data file
+    _write_atlas(_atlas_path)
@@ -0,0 +1,243 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+rules.py
+
+Purpose:  A library of in-place growth rules for Graph Motif Models, implementing the rules of
+          the example simulations with NumPy draws and bulk edge additions.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["random_attach","binomial_attach","watts_strogatz_attach","preferential_attach",
+    "component_fusion"]
+__docformat__ = "restructuredtext en"
+
+import networkx as nx
+from numpy import arange
+from sampling import DegreeSampler
+
+# Each function below returns a growth rule of the in-place protocol, see gmm.set_rule, which is
+# marked with an inplace attribute so that set_rule selects that protocol without being told.  The
+# rules draw all of their random numbers from the rng they are passed, and number new nodes from
+# the delta, so they neither search the base for its largest node nor copy it.
+
+def random_attach(edges=1):
+    """
+    Returns a growth rule that adds the new structure and ties it to the base with edges edges,
+    each from a node drawn uniformly from the base to a node drawn uniformly from the new
+    structure.  This is the rand_add rule of the basic example.
+
+    Parameters
+    ----------
+    edges : The number of edges between the base and the new structure.
+
+    Examples
+    ----------
+    >>> model=gmm.gmm(nx.petersen_graph(),node_ceiling,gmm.rules.random_attach())
+    """
+    def rule(delta, new, rng):
+        targets=_sample_nodes(delta,edges,rng)
+        nodes=delta.add_graph(new)
+        sources=rng.randint(len(nodes),size=edges).tolist()
+        delta.add_edges_from((u,nodes[i]) for u,i in zip(targets,sources))
+    return _inplace(rule)
+
+
+def binomial_attach(p=0.5):
+    """
+    Returns a growth rule that adds the new structure and ties each of its nodes to each node of
+    the base independently with probability p, the binomial_growth rule of the Erdos-Renyi
+    example.  The number of ties of each new node is drawn from the binomial distribution, and
+    that many distinct base nodes are then drawn uniformly, so a step takes time in the number
+    of ties rather than in the size of the base.
+
+    Parameters
+    ----------
+    p : The probability of a tie between a node of the new structure and a node of the base.
+    """
+    def rule(delta, new, rng):
+        size=delta.base.number_of_nodes()
+        ties=rng.binomial(size,p,size=new.number_of_nodes()).tolist()
+        targets=[_sample_nodes(delta,t,rng,distinct=True) for t in ties]
+        nodes=delta.add_graph(new)
+        delta.add_edges_from((u,v) for v,drawn in zip(nodes,targets) for u in drawn)
+    return _inplace(rule)
+
+
+def watts_strogatz_attach(k=2, p=0.5):
+    """
+    Returns a growth rule that adds the new structure, draws k distinct nodes of the base, and
+    ties each of them to each new node independently with probability p, the
+    watts_strogatz_growth rule of the Watts-Strogatz example.  If no tie is drawn, each of the k
+    base nodes is tied to a new node drawn uniformly, so that a connected base stays connected.
+
+    Parameters
+    ----------
+    k : The number of base nodes the new structure may be tied to.
+
+    p : The probability of a tie between one of the k base nodes and a new node.
+    """
+    def rule(delta, new, rng):
+        anchors=_sample_nodes(delta,k,rng,distinct=True)
+        nodes=delta.add_graph(new)
+        ties=rng.uniform(size=(len(anchors),len(nodes)))<=p
+        rows,cols=ties.nonzero()
+        if len(rows)==0:
+            rows,cols=arange(len(anchors)),rng.randint(len(nodes),size=len(anchors))
+        delta.add_edges_from(zip([nodes[j] for j in cols.tolist()],[anchors[i] for i in rows.tolist()]))
+    return _inplace(rule)
+
+
+def preferential_attach(m=1):
+    """
+    Returns a growth rule that adds the new structure and m edges from nodes drawn uniformly from
+    it to nodes of the base drawn with probability proportional to their degree, the
+    barabasi_albert_growth rule of the Barabasi-Albert example.  The base nodes are drawn from
+    the degree sampler of the model, see gmm.degree_sampler, which is kept up to date as edges
+    are added, so a step takes time logarithmic rather than linear in the size of the base.
+
+    Parameters
+    ----------
+    m : The number of edges between the new structure and the base.
+    """
+    def rule(delta, new, rng, model=None):
+        if model is not None and model.get_base() is delta.base:
+            sampler=model.degree_sampler()
+        else:
+            sampler=DegreeSampler(delta.base)
+        if sampler.total()>0:
+            targets=sampler.draw(m,rng)
+        else:
+            targets=_sample_nodes(delta,m,rng)
+        nodes=delta.add_graph(new)
+        sources=rng.randint(len(nodes),size=m).tolist()
+        delta.add_edges_from((nodes[i],v) for i,v in zip(sources,targets))
+    return _inplace(rule)
+
+
+def component_fusion(p=0.14, bipartite=False):
+    """
+    Returns a growth rule that, with probability p, fuses two components of the base through the
+    new structure, and otherwise adds the new structure as a component of its own.  This is the
+    ssrn_evo rule of the SSRN example.  A node is drawn from each of two distinct components,
+    or twice from the base if it is connected, and each is tied to a node drawn from the new
+    structure.  Components of directed graphs are weakly connected.
+
+    Parameters
+    ----------
+    p : The probability of fusing components.
+
+    bipartite : A boolean; if True the base is kept bipartite, ignoring edge direction.  The
+        nodes of the new structure are drawn so that each tie joins nodes of opposite sides,
+        found from a two-coloring of the new structure and, if both ties are made to one
+        component, of that component.  A ValueError is raised if a component to be fused is
+        not bipartite.  New structure that is not bipartite is skipped, whether or not it would
+        have fused components: the step adds nothing to the base and the simulation draws
+        another motif, where the example rule would add it as a component of its own.
+
+    Notes
+    -----
+    Fusion finds the components of the base, which takes time linear in its size, but no other
+    step depends on the size of the base.  Unlike the example rule, ties are only drawn once,
+    rather than again until the result is bipartite.
+    """
+    def rule(delta, new, rng):
+        fuse=rng.uniform()<p
+        if bipartite:
+            new_colors=_two_coloring(new,new.nodes())
+            if new_colors is None:
+                # Adding the new structure would break the bipartite base, so the motif is skipped
+                return
+        if not fuse:
+            delta.add_graph(new)
+            return
+        base=delta.base
+        if base.is_directed():
+            components=nx.weakly_connected_components(base)
+        else:
+            components=nx.connected_components(base)
+        if len(components)>1:
+            first,second=rng.choice(len(components),2,replace=False).tolist()
+        else:
+            first=second=0
+        u=components[first][rng.randint(len(components[first]))]
+        v=components[second][rng.randint(len(components[second]))]
+        if bipartite:
+            base_colors=_two_coloring(base,[u,v])
+            if base_colors is None:
+                raise ValueError("Components fused with bipartite=True must be bipartite")
+        nodes=delta.add_graph(new)
+        i=rng.randint(len(nodes))
+        if bipartite and first==second:
+            # v must be tied to the side of the new structure that keeps the path from u even
+            colors=[new_colors[w] for w in new.nodes()]
+            side=colors[i]^base_colors[v]
+            choices=[j for j in xrange(len(nodes)) if colors[j]==side]
+            j=choices[rng.randint(len(choices))]
+        else:
+            j=rng.randint(len(nodes))
+        delta.add_edges_from([(u,nodes[i]),(v,nodes[j])])
+    return _inplace(rule)
+
+
+def _inplace(rule):
+    """Marks rule as a growth rule of the in-place protocol"""
+    rule.inplace=True
+    return rule
+
+
+def _sample_nodes(delta, size, rng, distinct=False):
+    """Returns a list of size nodes drawn uniformly from the base of delta, or all of them if
+    distinct nodes are wanted and there are fewer.  When every node is labeled by a non-negative
+    integer and the labels are dense the draws are made by rejection from the labels below
+    delta.next_node(), so the base is not listed."""
+    base=delta.base
+    n=base.number_of_nodes()
+    if distinct and size>=n:
+        return base.nodes()
+    upper=delta.next_node()
+    if n>0 and delta.integer_nodes()==n and 2*n>=upper:
+        nodes=list()
+        drawn=set()
+        while len(nodes)<size:
+            for v in rng.randint(upper,size=2*(size-len(nodes))).tolist():
+                if v in base and not (distinct and v in drawn):
+                    nodes.append(v)
+                    drawn.add(v)
+        return nodes[:size]
+    labels=base.nodes()
+    if distinct:
+        return [labels[i] for i in rng.choice(n,size,replace=False).tolist()]
+    return [labels[i] for i in rng.randint(n,size=size).tolist()]
+
+
+def _two_coloring(G, sources):
+    """Returns a dictionary of the side, 0 or 1, of each node reached from sources by a breadth
+    first search of G ignoring edge direction, with the first source on side 0, or None if the
+    nodes reached are not bipartite"""
+    if G.is_directed():
+        neighbors=lambda v: G.succ[v].keys()+G.pred[v].keys()
+    else:
+        neighbors=lambda v: G.adj[v]
+    colors=dict()
+    for s in sources:
+        if s in colors:
+            continue
+        colors[s]=0
+        frontier=[s]
+        while frontier:
+            v=frontier.pop()
+            for w in neighbors(v):
+                if w not in colors:
+                    colors[w]=1-colors[v]
+                    frontier.append(w)
+                elif colors[w]==colors[v]:
+                    return None
+    return colors
+
+
+if __name__ == '__main__':
+    pass
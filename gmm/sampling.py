@@ -0,0 +1,298 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+sampling.py
+
+Purpose:  Random number streams and samplers for the random draws made while simulating 
+          Graph Motif Models.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["random_state","spawn","AliasSampler","FenwickSampler","DegreeSampler"]
+__docformat__ = "restructuredtext en"
+
+from numpy import asarray, uint64, zeros, random
+
+def random_state(seed=None):
+    """
+    Returns a NumPy RandomState for the given seed.  A RandomState is returned unchanged, so 
+    functions taking a seed can also share a stream; otherwise a new RandomState is seeded with 
+    seed, or with fresh entropy from the operating system if seed is None.
+    """
+    if isinstance(seed,random.RandomState):
+        return seed
+    return random.RandomState(seed)
+
+
+def spawn(seed, n):
+    """
+    Returns n independent RandomStates derived from seed, for the replicates or components of a 
+    simulation.  Child i is seeded with the words of seed followed by i, so it is the same 
+    however many children are spawned and whichever process uses it.
+
+    Parameters
+    ----------
+    seed : A non-negative integer or sequence of integers, a RandomState from which the words 
+        of the seed are drawn, or None for fresh entropy.
+
+    n : The number of RandomStates.
+
+    Returns
+    ----------
+    streams : A list of n RandomStates.
+    """
+    if seed is None or isinstance(seed,random.RandomState):
+        words=[int(w) for w in random_state(seed).randint(0,2**32,size=4,dtype=uint64)]
+    else:
+        words=list()
+        for value in (seed if hasattr(seed,"__iter__") else [seed]):
+            # Split large integers into 32 bit words
+            value=int(value)
+            while True:
+                words.append(value&0xffffffff)
+                value>>=32
+                if value==0:
+                    break
+    # A sequence seed initializes differently from an integer seed, so no child repeats its parent
+    return [random.RandomState(words+[i]) for i in xrange(n)]
+
+
+class AliasSampler(object):
+    """
+    Draws indices from a fixed discrete distribution in constant time per draw, using the alias
+    method of Walker (1977) with the table construction of Vose (1991).  Index i is drawn with
+    probability weights[i]/sum(weights).  Building the table takes time linear in the number
+    of weights, so a sampler should be kept and reused for as long as the weights are unchanged.
+
+    Parameters
+    ----------
+    weights : A sequence of non-negative numbers, not all zero.
+
+    rng : A NumPy RandomState used for the draws, defaults to the global NumPy state.
+
+    Examples
+    ----------
+    >>> sampler=AliasSampler([0.0,1.0,0.0])
+    >>> sampler.draw()
+    1
+    """
+    def __init__(self, weights, rng=None):
+        weights=asarray(weights,dtype=float)
+        if len(weights)==0 or (weights<0).any() or weights.sum()<=0:
+            raise ValueError("Weights must be non-negative with a positive sum")
+        self.weights=weights
+        self.rng=random if rng is None else rng
+        n=len(weights)
+        scaled=weights*n/weights.sum()
+        self.prob=zeros(n)
+        self.alias=zeros(n,dtype=int)
+        small=[i for i in xrange(n) if scaled[i]<1]
+        large=[i for i in xrange(n) if scaled[i]>=1]
+        # Pair each underfull column with an overfull one, which fills the rest of it
+        while small and large:
+            s=small.pop()
+            l=large.pop()
+            self.prob[s]=scaled[s]
+            self.alias[s]=l
+            scaled[l]=scaled[l]+scaled[s]-1
+            if scaled[l]<1:
+                small.append(l)
+            else:
+                large.append(l)
+        # Columns left over are full, up to rounding error
+        for i in large+small:
+            self.prob[i]=1.0
+            self.alias[i]=i
+
+    def __len__(self):
+        return len(self.prob)
+
+    def draw(self, size=None):
+        """Returns one index, or an array of size independent indices if size is given"""
+        if size is None:
+            i=self.rng.randint(len(self.prob))
+            if self.rng.uniform()<self.prob[i]:
+                return i
+            return int(self.alias[i])
+        columns=self.rng.randint(len(self.prob),size=size)
+        keep=self.rng.uniform(size=size)<self.prob[columns]
+        return columns*keep+self.alias[columns]*~keep
+
+
+class FenwickSampler(object):
+    """
+    Draws indices from a discrete distribution whose weights change, using a Fenwick (binary 
+    indexed) tree of the partial sums of the weights.  Index i is drawn with probability 
+    weights[i]/sum(weights).  Changing a weight, appending one, or making a draw takes time 
+    logarithmic in the number of weights, so unlike an AliasSampler the sampler can be kept 
+    up to date as the weights change rather than rebuilt.
+
+    Parameters
+    ----------
+    weights : An optional sequence of non-negative numbers.
+
+    rng : A NumPy RandomState used for the draws, defaults to the global NumPy state.
+
+    Examples
+    ----------
+    >>> sampler=FenwickSampler([0,1])
+    >>> sampler.update(0,2)
+    >>> sampler.append(1)
+    >>> sampler.weights
+    [2, 1, 1]
+    """
+    def __init__(self, weights=(), rng=None):
+        self.rng=random if rng is None else rng
+        self.weights=list(weights)
+        if any(w<0 for w in self.weights):
+            raise ValueError("Weights must be non-negative")
+        self._total=sum(self.weights)
+        self._build(max(len(self.weights),1))
+
+    def _build(self, capacity):
+        """Builds the tree of partial sums for at least capacity weights in linear time"""
+        self.capacity=1
+        while self.capacity<capacity:
+            self.capacity*=2
+        self.tree=[0]*(self.capacity+1)
+        for i,w in enumerate(self.weights):
+            self.tree[i+1]=w
+        # Every slot passes its partial sum up, including the empty slots past the last weight
+        for j in range(1,self.capacity+1):
+            parent=j+(j&-j)
+            if parent<=self.capacity:
+                self.tree[parent]+=self.tree[j]
+
+    def __len__(self):
+        return len(self.weights)
+
+    def total(self):
+        """Returns the sum of the weights"""
+        return self._total
+
+    def append(self, weight=0):
+        """Adds an index with the given weight, doubling the capacity of the tree when it is full"""
+        if len(self.weights)==self.capacity:
+            self.weights.append(0)
+            self._build(2*self.capacity)
+        else:
+            self.weights.append(0)
+        self.update(len(self.weights)-1,weight)
+
+    def update(self, i, change):
+        """Adds change to the weight of index i"""
+        if self.weights[i]+change<0:
+            raise ValueError("Weights must be non-negative")
+        self.weights[i]+=change
+        self._total+=change
+        j=i+1
+        while j<=self.capacity:
+            self.tree[j]+=change
+            j+=j&-j
+
+    def find(self, u):
+        """Returns the index i at which the partial sums of the weights first exceed u, for 
+        0<=u<sum(weights)"""
+        position=0
+        step=self.capacity
+        while step>0:
+            j=position+step
+            if j<=self.capacity and self.tree[j]<=u:
+                position=j
+                u-=self.tree[j]
+            step//=2
+        # Rounding of u at the top of the range can leave the search past the last positive weight,
+        # which is returned instead
+        if position>=len(self.weights) or self.weights[position]<=0:
+            position=min(position,len(self.weights))-1
+            while position>0 and self.weights[position]<=0:
+                position-=1
+        return position
+
+    def draw(self, size=None, rng=None):
+        """Returns one index, or a list of size independent indices if size is given, drawn with 
+        rng if given and the RandomState of the sampler otherwise"""
+        if self._total<=0:
+            raise ValueError("Weights must have a positive sum")
+        if rng is None:
+            rng=self.rng
+        if size is None:
+            return self.find(rng.uniform(0,self._total))
+        return [self.find(u) for u in rng.uniform(0,self._total,size=size).tolist()]
+
+
+class DegreeSampler(object):
+    """
+    Draws nodes of a growing graph with probability proportional to their degree, as for 
+    preferential attachment, keeping a FenwickSampler of the degrees up to date with the 
+    nodes and edges added.  A draw takes time logarithmic in the number of nodes, where 
+    computing the degrees for each draw takes time linear in the size of the graph.  See 
+    gmm.degree_sampler, which keeps one for the base graph of a model.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object, whose nodes are drawn with probability 
+        proportional to their degree, the sum of in and out degrees if G is directed.
+
+    rng : A NumPy RandomState used for the draws, defaults to the global NumPy state.
+    """
+    def __init__(self, G, rng=None):
+        self.labels=G.nodes()
+        self.index=dict((v,i) for i,v in enumerate(self.labels))
+        self.sampler=FenwickSampler([G.degree(v) for v in self.labels],rng)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def degree(self, v):
+        """Returns the degree of node v"""
+        return self.sampler.weights[self.index[v]]
+
+    def total(self):
+        """Returns the sum of the degrees, twice the number of edges"""
+        return self.sampler.total()
+
+    def add_node(self, v):
+        """Adds node v, without edges, if it is not already known"""
+        if v not in self.index:
+            self.index[v]=len(self.labels)
+            self.labels.append(v)
+            self.sampler.append(0)
+
+    def add_edges_from(self, edges):
+        """Adds one to the degree of each end of each edge, as (u,v) or (u,v,attributes) tuples, 
+        which must not already be in the graph"""
+        for e in edges:
+            for v in e[:2]:
+                self.add_node(v)
+                self.sampler.update(self.index[v],1)
+
+    def update(self, delta):
+        """Adds the nodes and edges of a GraphDelta, once it has been applied, or of a StepRecord 
+        without removals"""
+        for v in delta.nodes:
+            self.add_node(v)
+        self.add_edges_from(delta.edges)
+
+    def draw(self, size=None, rng=None):
+        """Returns one node, or a list of size nodes drawn independently, with probability 
+        proportional to degree"""
+        if size is None:
+            return self.labels[self.sampler.draw(rng=rng)]
+        return [self.labels[i] for i in self.sampler.draw(size,rng)]
+
+
+def _search_cumulative(cumulative, size, rng):
+    """Returns an array of size indices drawn in proportion to the increments of the array of 
+    cumulative weights.  Searching to the right of each draw skips indices of zero weight, and 
+    a draw rounded up to the total is given the last index of positive weight rather than an 
+    index past the end."""
+    last=cumulative.searchsorted(cumulative[-1])
+    return cumulative.searchsorted(rng.uniform(0,cumulative[-1],size=size),side="right").clip(0,last)
+
+
+if __name__ == '__main__':
+    pass
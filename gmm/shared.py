@@ -0,0 +1,147 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+shared.py
+
+Purpose:  Compressed sparse row (CSR) copies of a base graph held in shared memory, so that
+          worker processes can read the graph without it being pickled or rebuilt.
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+__author__="Drew Conway (drew.conway@nyu.edu)"
+__all__=["SharedCSRGraph"]
+__docformat__ = "restructuredtext en"
+
+from multiprocessing.sharedctypes import RawArray
+import networkx as nx
+from numpy import frombuffer, intc, ones
+from scipy import sparse
+
+class SharedCSRGraph(object):
+    """
+    A read-only copy of a NetworkX graph in compressed sparse row form, whose arrays are
+    allocated in shared memory.  The successors of node i are indices[indptr[i]:indptr[i+1]];
+    for directed graphs a second pair of arrays holds the neighbors of each node ignoring
+    direction.  Processes forked after the graph is built, such as the workers of a
+    multiprocessing.Pool given the graph as an initializer argument, read the same memory
+    through NumPy views, so no copy of the graph is made for each worker.
+
+    Parameters
+    ----------
+    G : A NetworkX Graph or DiGraph object.  Self loops are dropped.
+
+    nodes : An optional list of the nodes of G, giving the order in which they are numbered.
+        Defaults to G.nodes().
+
+    Examples
+    ----------
+    >>> csr=SharedCSRGraph(nx.petersen_graph())
+    >>> csr.neighbors(0)
+    array([1, 4, 5], dtype=int32)
+    """
+    def __init__(self, G, nodes=None):
+        self.directed=G.is_directed()
+        self.labels=G.nodes() if nodes is None else list(nodes)
+        index=dict((v,i) for i,v in enumerate(self.labels))
+        if self.directed:
+            succ=[[index[u] for u in G.successors_iter(v) if u!=v] for v in self.labels]
+            adj=[sorted(set(s)|set(index[u] for u in G.predecessors_iter(v) if u!=v))
+                for s,v in zip(succ,self.labels)]
+            self._succ=_shared_csr([sorted(s) for s in succ])
+            self._adj=_shared_csr(adj)
+        else:
+            adj=[sorted(index[u] for u in G.neighbors_iter(v) if u!=v) for v in self.labels]
+            self._adj=_shared_csr(adj)
+            self._succ=self._adj
+
+    def is_directed(self):
+        """Returns True if the graph is directed"""
+        return self.directed
+
+    def number_of_nodes(self):
+        """Returns the number of nodes"""
+        return len(self.labels)
+
+    def nodes(self):
+        """Returns the list of node labels of the original graph, in index order"""
+        return self.labels
+
+    def number_of_edges(self):
+        """Returns the number of edges"""
+        num_arcs=len(self._succ[1])
+        if self.directed:
+            return num_arcs
+        return num_arcs//2
+
+    def successors(self, i):
+        """Returns the indices of the successors of node index i, as a NumPy view"""
+        indptr,indices=self._succ
+        return indices[indptr[i]:indptr[i+1]]
+
+    def neighbors(self, i):
+        """Returns the indices of the neighbors of node index i, ignoring edge direction, as a
+        NumPy view"""
+        indptr,indices=self._adj
+        return indices[indptr[i]:indptr[i+1]]
+
+    def neighbor_sets(self):
+        """Returns a sequence of the neighbor sets of each node index, ignoring edge direction, 
+        which builds each set from the shared arrays the first time it is used"""
+        return _NeighborSets(*self._adj)
+
+    def successor_sets(self):
+        """Returns a sequence of the successor sets of each node index, built on first use"""
+        if not self.directed:
+            return self.neighbor_sets()
+        return _NeighborSets(*self._succ)
+
+    def adjacency_matrix(self):
+        """Returns the adjacency matrix as a SciPy CSR matrix sharing the index arrays"""
+        indptr,indices=self._succ
+        n=len(self.labels)
+        return sparse.csr_matrix((ones(len(indices),dtype=int),indices,indptr),shape=(n,n))
+
+    def to_networkx(self):
+        """Returns the graph as a NetworkX Graph or DiGraph object with the original labels"""
+        G=nx.DiGraph() if self.directed else nx.Graph()
+        G.add_nodes_from(self.labels)
+        for i,u in enumerate(self.labels):
+            G.add_edges_from((u,self.labels[j]) for j in self.successors(i))
+        return G
+
+
+class _NeighborSets(object):
+    """Lazily materialized sets of the column indices in each row of a CSR structure"""
+    def __init__(self, indptr, indices):
+        self.indptr=indptr
+        self.indices=indices
+        self.sets=dict()
+
+    def __len__(self):
+        return len(self.indptr)-1
+
+    def __getitem__(self, i):
+        try:
+            return self.sets[i]
+        except KeyError:
+            neighbors=self.sets[i]=set(self.indices[self.indptr[i]:self.indptr[i+1]].tolist())
+            return neighbors
+
+
+def _shared_csr(rows):
+    """Returns (indptr,indices) NumPy views of shared memory arrays holding the given lists of
+    column indices in CSR form"""
+    indptr=RawArray("i",len(rows)+1)
+    indices=RawArray("i",max(sum(len(r) for r in rows),1))
+    position=0
+    for i,r in enumerate(rows):
+        indices[position:position+len(r)]=r
+        position+=len(r)
+        indptr[i+1]=position
+    return frombuffer(indptr,dtype=intc),frombuffer(indices,dtype=intc)[:position]
+
+
+if __name__ == '__main__':
+    pass
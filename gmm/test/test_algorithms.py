@@ -13,9 +13,19 @@ Email:    drew.conway@nyu.edu
 
 import unittest
 import copy
+import multiprocessing
 import networkx as nx
+from numpy import random
+from scipy import stats
 import gmm
 
+def rand_add(base, new, rng):
+    """Growth rule tying the new structure to a node of the base drawn from rng"""
+    new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
+    new_base=nx.compose(base,new)
+    new_base.add_edge(rng.randint(base.number_of_nodes()),min(new))
+    return new_base
+
 class test_algorithms(unittest.TestCase):
     
     # GMM object place holder
@@ -37,6 +47,11 @@ class test_algorithms(unittest.TestCase):
         self.base_model=gmm.gmm(self.five_cycle)
         self.base_directed=gmm.gmm(copy.deepcopy(self.five_cycle).to_directed())
         
+    def growing_model(self, ceiling, base=None, R=rand_add, seed=None):
+        """Returns a model of base, the five-cycle by default, grown by R until it has ceiling nodes"""
+        return gmm.gmm(self.five_cycle if base is None else base,
+            lambda G: G.number_of_nodes()<ceiling,R,seed=seed)
+        
     def test_is_gmm(self):
         """Tests that functions return appropriate logical value"""
         self.assertTrue(self.base_model.am_gmm)
@@ -46,20 +61,296 @@ class test_algorithms(unittest.TestCase):
         base_counts=gmm.algorithms.motif_counts(self.base_model,self.test_tau)
         self.assertEquals(sum([(c) for (a,b,c) in base_counts]),20)
         directed_counts=gmm.algorithms.motif_counts(self.base_directed,self.test_tau)
-        self.assertEquals(sum([(c) for (a,b,c) in directed_counts]),10)
+        self.assertEquals(sum([(c) for (a,b,c) in directed_counts]),20)
+    
+    def test_esu_counts(self):
+        """Tests that the single pass ESU engine matches the VF2 motif counts"""
+        petersen_model=gmm.gmm(nx.petersen_graph())
+        for model in [self.base_model,self.base_directed,petersen_model]:
+            for tau in [3,4]:
+                vf2_counts=gmm.algorithms.motif_counts(model,tau)
+                esu_counts=gmm.algorithms.motif_counts(model,tau,method="esu")
+                self.assertEquals([(c) for (a,b,c) in esu_counts],[(c) for (a,b,c) in vf2_counts])
+        self.assertRaises(ValueError,gmm.algorithms.motif_counts,self.base_model,3,"unknown")
+    
+    def test_matrix_counts(self):
+        """Tests that closed form motif counts match the ESU engine"""
+        dense_model=gmm.gmm(nx.gnp_random_graph(30,0.3,seed=1))
+        for model in [self.base_model,dense_model]:
+            for tau in [2,3,4]:
+                esu_counts=gmm.algorithms.motif_counts(model,tau,method="esu")
+                matrix_counts=gmm.algorithms.motif_counts(model,tau,method="matrix")
+                self.assertEquals([(c) for (a,b,c) in matrix_counts],[(c) for (a,b,c) in esu_counts])
+        # Directed triad census
+        directed_model=gmm.gmm(nx.gnp_random_graph(30,0.2,seed=1,directed=True))
+        for model in [self.base_directed,directed_model]:
+            esu_counts=gmm.algorithms.motif_counts(model,3,method="esu")
+            matrix_counts=gmm.algorithms.motif_counts(model,3,method="matrix")
+            self.assertEquals([(c) for (a,b,c) in matrix_counts],[(c) for (a,b,c) in esu_counts])
+        self.assertRaises(ValueError,gmm.algorithms.motif_counts,self.base_directed,4,"matrix")
+        self.assertRaises(ValueError,gmm.algorithms.motif_counts,self.base_model,5,"matrix")
+    
+    def test_sample_counts(self):
+        """Tests that sampled motif counts are returned with confidence intervals, and are exact 
+        when every node has the same neighborhood structure and within the intervals otherwise"""
+        petersen_model=gmm.gmm(nx.petersen_graph())
+        exact=gmm.algorithms.motif_counts(petersen_model,4,method="esu")
+        estimates,intervals=gmm.algorithms.motif_counts(petersen_model,4,method="sample",samples=20,
+            intervals=True)
+        self.assertEquals(len(intervals),len(estimates))
+        for (a,b,c),(i,low,high),(x,y,count) in zip(estimates,intervals,exact):
+            self.assertAlmostEquals(c,count)
+            self.assertTrue(low<=count<=high)
+        self.assertRaises(ValueError,gmm.counting.sample_counts,petersen_model.get_base(),exact,[0])
+        self.assertRaises(ValueError,gmm.counting.sample_counts,petersen_model.get_base(),exact,
+            samples=0)
+        # Roots of a lollipop graph have different neighborhoods, so the estimates vary but their
+        # intervals hold the exact counts
+        lollipop=nx.lollipop_graph(5,4)
+        exact=gmm.algorithms.motif_counts(gmm.gmm(lollipop),4,method="esu")
+        estimates,intervals=gmm.counting.sample_counts(lollipop,exact,samples=500,confidence=0.999,
+            intervals=True,rng=random.RandomState(0))
+        for c,(low,high),(a,b,count) in zip(estimates,intervals,exact):
+            self.assertTrue(low<=count<=high)
+            self.assertEquals(low<high,count>0)
+        # Simulations drop the intervals from counts they keep up to date
+        model=self.growing_model(15,nx.petersen_graph())
+        gmm.algorithms.simulate(model,3,seed=0,counting="sample",
+            counting_options={"samples":20,"intervals":True})
+        self.assertTrue(model.get_base().number_of_nodes()>=15)
+    
+    def test_color_coding_counts(self):
+        """Tests that color coded estimates are close to the exact motif counts, and are zero for
+        motifs that do not occur"""
+        petersen_model=gmm.gmm(nx.petersen_graph())
+        exact=[(c) for (a,b,c) in gmm.algorithms.motif_counts(petersen_model,5,method="esu",
+            occurrences=True)]
+        estimates=[(c) for (a,b,c) in gmm.algorithms.motif_counts(petersen_model,5,
+            method="color-coding",occurrences=True,repeats=200,rng=gmm.algorithms.random.RandomState(0))]
+        for count,estimate in zip(exact,estimates):
+            if count==0:
+                self.assertEquals(estimate,0)
+        self.assertTrue(abs(sum(estimates)-sum(exact))<0.15*sum(exact))
+        self.assertRaises(ValueError,gmm.counting.color_coding_counts,petersen_model.get_base(),
+            gmm.algorithms.get_motifs(3,False),[0])
+
+    def test_occurrence_counts(self):
+        """Tests that symmetric motifs are counted once per occurrence, and that raw subgraph 
+        isomorphism counts are recovered from the automorphism counts"""
+        complete_model=gmm.gmm(nx.complete_graph(5))
+        for method in ["vf2","esu"]:
+            occurrences=gmm.algorithms.motif_counts(complete_model,4,method,occurrences=True)
+            # Every induced subgraph of K5 is complete: 10 edges, 10 triangles and 5 K4s
+            self.assertEquals([(c) for (a,b,c) in occurrences if c>0],[10,10,5])
+            isomorphisms=gmm.algorithms.motif_counts(complete_model,4,method)
+            self.assertEquals([(c) for (a,b,c) in isomorphisms if c>0],[20,60,120])
+    
+    def test_shared_counts(self):
+        """Tests that motif counts of the shared memory CSR base structure match those of the
+        NetworkX base structure, including when counted by worker processes"""
+        random_model=gmm.gmm(nx.gnp_random_graph(20,0.3,seed=2))
+        shared_base=random_model.shared_base()
+        self.assertEquals(shared_base.number_of_edges(),random_model.get_base().number_of_edges())
+        self.assertTrue(nx.is_isomorphic(shared_base.to_networkx(),random_model.get_base()))
+        for model in [random_model,self.base_directed]:
+            esu_counts=[(c) for (a,b,c) in gmm.algorithms.motif_counts(model,3,method="esu")]
+            for method in ["vf2","esu","matrix"]:
+                shared_counts=gmm.algorithms.motif_counts(model,3,method,shared=True)
+                self.assertEquals([(c) for (a,b,c) in shared_counts],esu_counts)
+            parallel_counts=gmm.algorithms.motif_counts(model,3,method="esu",shared=True,workers=2)
+            self.assertEquals([(c) for (a,b,c) in parallel_counts],esu_counts)
+
+    def test_parallel_counts(self):
+        """Tests that counts divided among worker processes, started for the count or kept by the 
+        caller, match serial counts"""
+        lollipop=gmm.gmm(nx.lollipop_graph(5,4))
+        for model in [lollipop,self.base_directed]:
+            for method in ["vf2","esu"]:
+                serial=gmm.algorithms.motif_counts(model,3,method)
+                self.assertEquals(gmm.algorithms.motif_counts(model,3,method,workers=2),serial)
+                pool=multiprocessing.Pool(2)
+                try:
+                    self.assertEquals(gmm.algorithms.motif_counts(model,3,method,pool=pool),serial)
+                    self.assertEquals(gmm.algorithms.motif_counts(model,3,method,workers=2,pool=pool),serial)
+                    # VF2 workers count only the subgraphs touching the anchors
+                    if method=="vf2":
+                        motifs=gmm.algorithms.get_motifs(3,model.get_base().is_directed())
+                        self.assertEquals(gmm.counting.vf2_counts(model.get_base(),motifs,[0],pool=pool),
+                            gmm.counting.vf2_counts(model.get_base(),motifs,[0]))
+                finally:
+                    pool.terminate()
+        # Simulations recounting in full keep one pool for every count
+        grown=list()
+        for method in ["vf2","esu"]:
+            for options,incremental in [(None,True),({"workers":2},True),({"workers":2},False)]:
+                model=self.growing_model(20)
+                gmm.algorithms.simulate(model,self.test_tau,seed=3,incremental=incremental,
+                    counting=method,counting_options=options)
+                grown.append(sorted(model.get_base().edges()))
+        for edges in grown[1:]:
+            self.assertEquals(edges,grown[0])
+    
+    def test_incremental_counts(self):
+        """Tests that incrementally updated motif counts match a full recount"""
+        counter=gmm.algorithms.IncrementalCounter(self.test_tau,False,"esu")
+        counter.update(self.base_model.get_base())
+        grown=nx.compose(self.base_model.get_base(),nx.Graph(data=[(4,5),(5,6),(6,4),(0,2)]))
+        grown.remove_edge(2,3)
+        self.base_model.set_base(grown)
+        full_counts=[(c) for (a,b,c) in gmm.algorithms.motif_counts(self.base_model,self.test_tau)]
+        self.assertEquals([(c) for (a,b,c) in counter.update(grown)],full_counts)
+        directed_counter=gmm.algorithms.IncrementalCounter(self.test_tau,True)
+        directed_counter.update(self.base_directed.get_base())
+        directed_grown=nx.compose(self.base_directed.get_base(),nx.DiGraph(data=[(4,5),(5,0)]))
+        self.base_directed.set_base(directed_grown)
+        full_counts=[(c) for (a,b,c) in gmm.algorithms.motif_counts(self.base_directed,self.test_tau)]
+        self.assertEquals([(c) for (a,b,c) in directed_counter.update(directed_grown)],full_counts)
+    
+    def test_seeded_simulation(self):
+        """Tests that simulations with the same seed are identical and leave the global NumPy 
+        random state alone"""
+        state=gmm.algorithms.random.get_state()
+        simulated=list()
+        for i in xrange(2):
+            model=self.growing_model(30)
+            gmm.algorithms.simulate(model,self.test_tau,seed=7)
+            simulated.append(sorted(model.get_base().edges()))
+        self.assertEquals(simulated[0],simulated[1])
+        self.assertEquals(gmm.algorithms.random.get_state()[1].tolist(),state[1].tolist())
+        # Without a seed the stream of the model is used
+        model=self.growing_model(30,seed=7)
+        gmm.algorithms.simulate(model,self.test_tau)
+        other=self.growing_model(30,seed=8)
+        gmm.algorithms.simulate(other,self.test_tau,seed=7)
+        self.assertEquals(sorted(model.get_base().edges()),sorted(other.get_base().edges()))
+    
+    def test_refresh_policy(self):
+        """Tests that the motif distribution is recomputed as often as the refresh policy says, 
+        and that the policy is reported in the run information"""
+        for refresh in ["always","never",("steps",4),("growth",0.5)]:
+            model=self.growing_model(40)
+            gmm.algorithms.simulate(model,self.test_tau,seed=1,refresh=refresh)
+            steps,refreshes=model.run_info["steps"],model.run_info["refreshes"]
+            self.assertEquals(model.run_info["refresh"],refresh)
+            if refresh=="always":
+                self.assertEquals(refreshes,steps)
+            elif refresh=="never":
+                self.assertEquals(refreshes,1)
+            elif refresh[0]=="steps":
+                self.assertEquals(refreshes,(steps+3)//4)
+            else:
+                # Node counts from 5 to 40 grow by half at most six times
+                self.assertTrue(1<refreshes<=6)
+        for refresh in [("steps",0),("steps",2.5),("steps","4"),("growth",0),("growth",-0.5),
+            ("growth","abc"),("growth",None),"sometimes"]:
+            self.assertRaises(ValueError,gmm.algorithms.simulate,model,self.test_tau,refresh=refresh)
+    
+    def test_batched_growth(self):
+        """Tests that batches of motifs are drawn from one distribution, with termination checked 
+        between them, and that counts kept across a batch match full recounts"""
+        grown=list()
+        for incremental in [True,False]:
+            model=self.growing_model(40)
+            gmm.algorithms.simulate(model,self.test_tau,seed=1,batch_size=4,incremental=incremental)
+            self.assertTrue(40<=model.get_base().number_of_nodes()<40+self.test_tau)
+            self.assertEquals(model.run_info["refreshes"],(model.run_info["steps"]+3)//4)
+            grown.append(sorted(model.get_base().edges()))
+        self.assertEquals(grown[0],grown[1])
+        self.assertRaises(ValueError,gmm.algorithms.simulate,model,self.test_tau,batch_size=0)
+    
+    def test_step_records(self):
+        """Tests that the records published by simulate rebuild the grown graph, and that counts 
+        following the records of in-place growth match full recounts"""
+        def inplace_add(delta, new, rng):
+            nodes=delta.add_graph(new)
+            delta.add_edge(rng.randint(delta.base.number_of_nodes()),nodes[0])
+        grown=list()
+        for rule,inplace in [(inplace_add,True),(rand_add,False),(inplace_add,True)]:
+            model=self.growing_model(40,R=None)
+            model.set_rule(rule,inplace=inplace)
+            records=list()
+            gmm.algorithms.simulate(model,self.test_tau,seed=2,incremental=len(grown)<2,
+                subscribers=[lambda record,G: records.append(record)])
+            rebuilt=self.five_cycle.copy()
+            for record in records:
+                rebuilt.add_nodes_from(record.nodes)
+                rebuilt.add_edges_from(record.edges)
+            self.assertEquals(sorted(rebuilt.edges()),sorted(model.get_base().edges()))
+            self.assertEquals([r.step for r in records],range(model.run_info["steps"]))
+            grown.append(sorted(model.get_base().edges()))
+        # Incremental counts from records, diffs and full recounts draw the same motifs
+        self.assertEquals(grown[0],grown[1])
+        self.assertEquals(grown[0],grown[2])
+        # Rules that change the base in place and return it publish what they added
+        def mutating_add(base, new, rng):
+            new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
+            base.add_edges_from(new.edges())
+            base.add_edge(rng.randint(min(new)),min(new))
+            return base
+        model=self.growing_model(30,R=mutating_add)
+        start=model.get_base().copy()
+        counter=gmm.algorithms.IncrementalCounter(self.test_tau,False,"esu")
+        counter.update(model.get_base())
+        records=list()
+        gmm.algorithms.simulate(model,self.test_tau,seed=2,
+            subscribers=[lambda record,G: records.append(record),counter.record_step])
+        self.assertTrue(all(len(record.nodes)>0 for record in records))
+        for record in records:
+            start.add_nodes_from(record.nodes)
+            start.add_edges_from(record.edges)
+        self.assertEquals(sorted(start.edges()),sorted(model.get_base().edges()))
+        full_counts=[(c) for (a,b,c) in gmm.algorithms.motif_counts(model,self.test_tau,"esu")]
+        self.assertEquals([(c) for (a,b,c) in counter.update(model.get_base())],full_counts)
+        # The counter only recounts around the added structure
+        counter=gmm.algorithms.IncrementalCounter(self.test_tau,False)
+        base=self.five_cycle.copy()
+        counter.update(base)
+        delta=gmm.delta.GraphDelta(base)
+        delta.add_edges_from([(0,2),(4,5),(5,6)])
+        delta.apply()
+        counter.record_step(delta.record(0,0),base)
+        full_counts=[(c) for (a,b,c) in gmm.algorithms.IncrementalCounter(self.test_tau,False).update(base)]
+        self.assertEquals([(c) for (a,b,c) in counter.update(base)],full_counts)
     
     def test_get_motifs(self):
         """Test that the appropriate graph motifs are returned given tau"""
         base_motifs=gmm.algorithms.get_motifs(self.test_tau,False)
         directed_motifs=gmm.algorithms.get_motifs(self.test_tau,True)
         self.assertTrue(len(base_motifs)==3)
-        self.assertTrue(len(directed_motifs)==8)
+        self.assertTrue(len(directed_motifs)==15)
+        # Connected graphs from the motif atlas
+        self.assertEquals(len(gmm.algorithms.get_motifs(6,False)),1+2+6+21+112)
+        self.assertEquals(len(gmm.algorithms.get_motifs(4,True)),2+13+199)
+        
+    def test_motif_cache(self):
+        """Tests that motif sets are shared between calls and evicted least recently used first"""
+        cache=gmm.algorithms.MotifCache(maxsize=2)
+        first=cache.get(3,False)
+        self.assertTrue(cache.get(3,False) is first)
+        self.assertEquals(first[0],gmm.motifs.Motif.from_graph(nx.path_graph(2)))
+        cache.get(3,True)
+        cache.get(3,False)
+        cache.get(4,False)     # Evicts the directed set
+        self.assertEquals(cache.cache_info(),(2,3,2,2))
+        self.assertTrue(cache.get(3,False) is first)
+        cache.cache_clear()
+        self.assertEquals(cache.cache_info(),(0,0,2,0))
+        # get_motifs returns a new list of the shared graphs
+        motifs=gmm.algorithms.get_motifs(3,False)
+        self.assertTrue(motifs is not gmm.algorithms.get_motifs(3,False))
+        self.assertTrue(motifs[0][1] is gmm.algorithms.get_motifs(3,False)[0][1])
         
     def test_draw_structure(self):
         """Checks that the random selection of structure is implemented properly"""
         test_motifs=[(0,False,0.0),(1,True,1.0),(2,False,0.0)]
         non_random_draw=gmm.algorithms.draw_structure(test_motifs)
         self.assertTrue(non_random_draw)
+        # Batch draws return motif indices
+        self.assertEquals(list(gmm.algorithms.draw_structure(test_motifs,size=50)),[1]*50)
+        motif_mass=[(0,False,0.25),(1,False,0.0),(2,False,0.75)]
+        indices=gmm.algorithms.draw_structure(motif_mass,size=10000)
+        self.assertEquals(list(indices).count(1),0)
+        self.assertAlmostEquals(list(indices).count(2)/10000.0,0.75,places=1)
         
     def test_poisson(self):
         """Tests that the Poisson probability mass is returned correctly for
@@ -72,13 +363,26 @@ class test_algorithms(unittest.TestCase):
         directed_positive=map(lambda x: x>0, [(c) for (a,b,c) in directed_mass])
         self.assertEquals(directed_positive.count(False),0)
     
+    def test_poisson_pmf(self):
+        """Tests that the cached Poisson mass matches SciPy for the index of the largest count"""
+        counts=[(i,None,c) for i,c in enumerate([3,9,4,1,0])]
+        for i in xrange(2):
+            mass=gmm.algorithms.poisson_mass(list(counts))
+            for (a,b,c) in mass:
+                self.assertAlmostEquals(c,stats.poisson.pmf(a,1))
+    
     def test_all_graphs(self):
         """Tests that function returns correct graphs"""
         all_base=gmm.algorithms.all_graphs(self.test_tau,False)
         all_directed=gmm.algorithms.all_graphs(self.test_tau,True)
         self.assertTrue(len(all_base)!=len(all_directed))
         self.assertTrue(len(all_base)==2)       # For tau=3 and undirected graphs there should be 2 single component graphs
-        self.assertTrue(len(all_directed)==6)   # For tau=3 and directed graphs there should be 6 single component graphs
+        self.assertTrue(len(all_directed)==13)  # For tau=3 and directed graphs there should be 13 single component graphs
+        # One graph for each isomorphism class
+        for graphs in [all_base,all_directed,gmm.algorithms.all_graphs(7,False)]:
+            codes=set(gmm.motifs.graph_code(g) for g in graphs)
+            self.assertEquals(len(codes),len(graphs))
+        self.assertEquals(len(gmm.algorithms.all_graphs(7,False)),853)
 
     
 if __name__ == '__main__':
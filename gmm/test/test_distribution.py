@@ -0,0 +1,69 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_distribution.py
+
+Purpose:  Tests for the motif distributions passed between counting, estimation and drawing
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+
+import unittest
+import pickle
+import networkx as nx
+from numpy import random, zeros
+import gmm
+
+class test_distribution(unittest.TestCase):
+    """Tests for MotifDistribution"""
+
+    # Undirected motifs of up to three nodes
+    motifs=gmm.algorithms.motif_cache.get(3,False)
+
+    def test_estimators(self):
+        """Tests the vectorized mass estimators against the list based functions"""
+        dist=gmm.distribution.MotifDistribution(self.motifs,[6,2,0])
+        self.assertEquals(dist.count_ratio().mass.tolist(),[0.75,0.25,0.0])
+        self.assertEquals(dist.estimate("smoothed",alpha=1.0).mass.tolist(),[7/11.0,3/11.0,1/11.0])
+        poisson=[(c) for (a,b,c) in gmm.algorithms.poisson_mass(dist.to_list())]
+        self.assertEquals(dist.poisson().mass.tolist(),poisson)
+        self.assertTrue(dist.poisson().counts is dist.counts)
+        self.assertRaises(ValueError,dist.estimate,"unknown")
+        self.assertRaises(ValueError,dist.draw)
+        self.assertRaises(ValueError,gmm.distribution.MotifDistribution(self.motifs,[0,0,0]).count_ratio)
+
+    def test_draw(self):
+        """Tests that draws never return motifs without mass, even when rounded up to the total 
+        mass, and that a distribution survives pickling"""
+        dist=gmm.distribution.MotifDistribution(self.motifs,[0,3,1]).count_ratio()
+        rng=random.RandomState(0)
+        self.assertTrue(dist.draw(rng=rng) in self.motifs[1:])
+        indices=dist.draw(size=1000,rng=rng)
+        self.assertEquals(list(indices).count(0),0)
+        self.assertEquals(list(dist.draw(size=1000,sampler=dist.sampler(rng))).count(0),0)
+        self.assertTrue(gmm.algorithms.draw_structure(dist,rng=rng) in self.motifs[1:])
+        # Uniform draws rounded up to the total mass give the last motif with mass
+        class rounded_up(object):
+            def uniform(self, low, high, size=None):
+                return zeros(size)+high
+        dist=gmm.distribution.MotifDistribution(self.motifs,[1,3,0]).count_ratio()
+        self.assertEquals(dist.draw(size=2,rng=rounded_up()).tolist(),[1,1])
+        self.assertEquals(gmm.algorithms.draw_structure(dist.to_list(),size=2,rng=rounded_up()).tolist(),
+            [1,1])
+        copied=pickle.loads(pickle.dumps(dist))
+        self.assertEquals(copied.motifs,dist.motifs)
+        self.assertEquals(copied.mass.tolist(),dist.mass.tolist())
+
+    def test_counted_distribution(self):
+        """Tests that distributions from the counting functions hold the shared motif set"""
+        model=gmm.gmm(nx.petersen_graph())
+        dist=gmm.algorithms.motif_distribution(model,3)
+        self.assertTrue(dist.motifs is self.motifs)
+        self.assertEquals(dist.to_list(),gmm.algorithms.motif_counts(model,3))
+        counter=gmm.algorithms.IncrementalCounter(3,False)
+        self.assertEquals(counter.distribution(model.get_base()).counts.tolist(),dist.counts.tolist())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -87,5 +87,110 @@ class test_gmm(unittest.TestCase):
         self.full_model.apply_rule(directed_triangle,set_result=True)
         self.assertFalse(self.full_model.get_base().is_directed())
     
+    def testRuleRandomState(self):
+        """Test that rules taking an rng argument draw from the stream of the model"""
+        def rand_add(base, new, rng):
+            new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
+            new_base=nx.compose(base,new)
+            new_base.add_edge(rng.randint(base.number_of_nodes()),rng.randint(min(new),max(new)+1))
+            return new_base
+        grown=list()
+        for i in xrange(2):
+            model=gmm.gmm(self.five_cycle,R=rand_add,seed=11)
+            for j in xrange(5):
+                model.apply_rule(self.test_triangle,set_result=True)
+            grown.append(sorted(model.get_base().edges()))
+        self.assertEquals(grown[0],grown[1])
+        # A rule taking keyword arguments is passed the stream as well
+        streams=list()
+        def keyword_add(base, new, **options):
+            streams.append(options["rng"])
+            return rand_add(base,new,options["rng"])
+        model.set_rule(keyword_add)
+        model.apply_rule(self.test_triangle,set_result=True)
+        self.assertTrue(streams[-1] is model.rng)
+    
+    def testNodeAllocation(self):
+        """Test that new node labels are numbered on from the base without reuse"""
+        def fast_add(base, new, rng, model):
+            new_base=base.copy()
+            nodes=model.relabel_into(new_base,new)
+            new_base.add_edge(rng.randint(base.number_of_nodes()),nodes[0])
+            return new_base
+        model=gmm.gmm(self.five_cycle,R=fast_add)
+        self.assertEquals(model.next_node,5)
+        self.assertEquals(model.new_nodes(2),[5,6])
+        model.apply_rule(self.test_triangle,set_result=True)
+        self.assertEquals(sorted(model.get_base().nodes()),range(5)+[7,8,9])
+        self.assertEquals(model.next_node,10)
+        # Rules numbering from the largest label leave the counter past their nodes
+        self.full_model.apply_rule(self.test_triangle,set_result=True)
+        self.assertEquals(self.full_model.next_node,8)
+        # Labels added with gaps leave the counter past the largest of them
+        def offset_add(base, new):
+            new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+10)
+            new_base=nx.compose(base,new)
+            new_base.add_edge(0,min(new))
+            return new_base
+        self.full_model.set_rule(offset_add)
+        self.full_model.apply_rule(self.test_triangle,set_result=True)
+        self.assertEquals(self.full_model.next_node,20)
+        def offset_delta(delta, new):
+            delta.add_edge(0,delta.next_node()+10)
+        self.full_model.set_rule(offset_delta,inplace=True)
+        self.full_model.apply_rule(self.test_triangle,set_result=True)
+        self.assertEquals(self.full_model.next_node,31)
+        self.full_model.revert_base()
+        self.assertEquals(self.full_model.next_node,5)
+        # Deltas of in-place rules number from the counter
+        self.full_model.new_nodes(3)
+        self.assertEquals(gmm.delta.GraphDelta(self.full_model.get_base(),self.full_model.next_node).new_node(),8)
+        # In-place rules may take labels from both the model and the delta without collisions
+        def mixed_add(delta, new, model):
+            added=nx.Graph()
+            first=delta.add_graph(new)
+            second=model.relabel_into(added,new)
+            third=delta.add_graph(new)
+            added.add_edge(first[0],second[0])
+            delta.add_edges_from([(second[0],third[0]),(0,model.new_nodes(1)[0])])
+            return added
+        model=gmm.gmm(self.five_cycle,R=mixed_add,inplace=True)
+        model.apply_rule(self.test_triangle,set_result=True)
+        self.assertEquals(sorted(model.get_base().nodes()),range(15))
+        self.assertEquals(model.get_base().number_of_edges(),5+3*3+3)
+        self.assertEquals(model.next_node,15)
+    
+    def testInplaceRule(self):
+        """Test that in-place growth rules add to the base graph without replacing it, and grow 
+        the same graphs as the equivalent rule returning a new base"""
+        def inplace_add(delta, new, rng):
+            nodes=delta.add_graph(new)
+            delta.add_edge(rng.randint(delta.base.number_of_nodes()),rng.randint(nodes[0],nodes[-1]+1))
+        def compose_add(base, new, rng):
+            new=nx.convert_node_labels_to_integers(new,first_label=max(base.nodes())+1)
+            new_base=nx.compose(base,new)
+            new_base.add_edge(rng.randint(base.number_of_nodes()),rng.randint(min(new),max(new)+1))
+            return new_base
+        def added_edges(delta, new):
+            return nx.Graph(data=[(0,5)])
+        model=gmm.gmm(self.five_cycle,R=inplace_add,inplace=True)
+        base=model.get_base()
+        self.assertEquals(model.apply_rule(self.test_triangle).number_of_nodes(),8)
+        self.assertEquals(base.number_of_nodes(),5)
+        self.assertTrue(model.apply_rule(self.test_triangle,set_result=True) is base)
+        self.assertEquals(base.number_of_nodes(),8)
+        self.assertEquals(base.number_of_edges(),9)
+        model.set_rule(added_edges,inplace=True)
+        model.apply_rule(self.test_triangle,set_result=True)
+        self.assertTrue(model.get_base().has_edge(0,5))
+        # Both protocols grow the same graph from the same random numbers
+        grown=list()
+        for rule,inplace in [(inplace_add,True),(compose_add,False)]:
+            model=gmm.gmm(self.five_cycle,lambda G: G.number_of_nodes()<30,seed=3)
+            model.set_rule(rule,inplace=inplace)
+            gmm.algorithms.simulate(model,3)
+            grown.append(sorted(model.get_base().edges()))
+        self.assertEquals(grown[0],grown[1])
+    
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,65 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_motifs.py
+
+Purpose:  Tests for the canonical labeling of graph motifs
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+
+import unittest
+import pickle
+import networkx as nx
+import gmm
+
+class test_motifs(unittest.TestCase):
+    """Tests for canonical labeling of graph motifs"""
+    
+    # Two labelings of the four node path
+    path=nx.Graph(data=[(0,1),(1,2),(2,3)])
+    relabeled_path=nx.Graph(data=[(2,0),(0,3),(3,1)])
+    
+    # Four node star
+    star=nx.Graph(data=[(0,1),(0,2),(0,3)])
+    
+    def test_graph_code(self):
+        """Tests that graph codes are equal only for isomorphic graphs"""
+        self.assertEquals(gmm.motifs.graph_code(self.path),gmm.motifs.graph_code(self.relabeled_path))
+        self.assertNotEquals(gmm.motifs.graph_code(self.path),gmm.motifs.graph_code(self.star))
+        # Direction of edges is respected
+        self.assertNotEquals(gmm.motifs.graph_code(nx.DiGraph(data=[(0,1),(1,2)])),
+            gmm.motifs.graph_code(nx.DiGraph(data=[(0,1),(2,1)])))
+        # Codes of induced subgraphs
+        self.assertEquals(gmm.motifs.graph_code(nx.complete_graph(5),[0,1,2]),
+            gmm.motifs.graph_code(nx.complete_graph(3)))
+    
+    def test_automorphisms(self):
+        """Tests that the number of automorphisms is counted correctly"""
+        for G,count in [(nx.complete_graph(4),24),(self.path,2),(self.star,6),(nx.cycle_graph(5),10)]:
+            n,mask=gmm.motifs.graph_code(G)
+            self.assertEquals(gmm.motifs.automorphisms(n,mask,False),count)
+    
+    def test_motif(self):
+        """Tests that motifs compare by canonical code and convert to NetworkX graphs"""
+        path_motif=gmm.motifs.Motif.from_graph(self.path)
+        self.assertEquals(path_motif,gmm.motifs.Motif.from_graph(self.relabeled_path))
+        self.assertNotEquals(path_motif,gmm.motifs.Motif.from_graph(self.star))
+        self.assertEquals(len(set([path_motif,gmm.motifs.Motif.from_graph(self.relabeled_path)])),1)
+        self.assertTrue(nx.is_isomorphic(path_motif.to_networkx(),self.path))
+        self.assertEquals(gmm.motifs.graph_code(path_motif),gmm.motifs.graph_code(self.path))
+        self.assertEquals(pickle.loads(pickle.dumps(path_motif)),path_motif)
+    
+    def test_atlas(self):
+        """Tests that the motif atlas holds the canonical codes of connected graphs"""
+        for directed in [False,True]:
+            for mask in gmm.motifs.atlas_codes(4,directed):
+                G=gmm.motifs.code_graph(4,mask,directed)
+                self.assertEquals(gmm.motifs.graph_code(G),(4,mask))
+                self.assertEquals(nx.number_weakly_connected_components(G.to_directed()),1)
+        self.assertEquals(gmm.motifs.atlas_codes(7,False),None)
+    
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_rules.py
+
+Purpose:  Tests for the library of in-place growth rules
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+
+import unittest
+import networkx as nx
+from numpy import random
+import gmm
+
+class test_rules(unittest.TestCase):
+    """Tests for the growth rules of gmm.rules"""
+
+    # Base graph
+    five_cycle=nx.cycle_graph(5)
+
+    # New structure
+    test_triangle=nx.Graph(data=[(0,1),(1,2),(0,2)])
+
+    def grow(self, rule, base=None, ceiling=60):
+        """Returns the base of a model grown with rule until it has ceiling nodes"""
+        model=gmm.gmm(self.five_cycle if base is None else base,
+            lambda G: G.number_of_nodes()<ceiling,rule,seed=0)
+        gmm.algorithms.simulate(model,3)
+        return model.get_base()
+
+    def test_rule_protocol(self):
+        """Tests that the rules are applied in place without being declared in-place"""
+        model=gmm.gmm(self.five_cycle,R=gmm.rules.random_attach(edges=2))
+        base=model.get_base()
+        model.apply_rule(self.test_triangle,set_result=True)
+        self.assertTrue(model.get_base() is base)
+        self.assertEquals(base.number_of_nodes(),8)
+        self.assertTrue(base.number_of_edges() in [9,10])
+        for rule in [gmm.rules.random_attach(),gmm.rules.binomial_attach(0.2),
+            gmm.rules.watts_strogatz_attach(),gmm.rules.preferential_attach(2)]:
+            G=self.grow(rule)
+            self.assertTrue(G.number_of_nodes()>=60)
+            self.assertTrue(nx.is_connected(G))
+
+    def test_attach(self):
+        """Tests the ties drawn by the attachment rules"""
+        def grown(rule):
+            delta=gmm.delta.GraphDelta(self.five_cycle.copy())
+            rule(delta,self.test_triangle,random.RandomState(1))
+            return delta.apply()
+        # All ties between base and new nodes are made with probability one
+        G=grown(gmm.rules.binomial_attach(1.0))
+        self.assertEquals(G.number_of_edges(),5+3+5*3)
+        self.assertEquals(grown(gmm.rules.binomial_attach(0.0)).number_of_edges(),5+3)
+        G=grown(gmm.rules.watts_strogatz_attach(k=2,p=1.0))
+        self.assertEquals(G.number_of_edges(),5+3+2*3)
+        self.assertEquals(grown(gmm.rules.watts_strogatz_attach(k=2,p=0.0)).number_of_edges(),5+3+2)
+        # Preferential attachment never ties to nodes without edges
+        base=self.five_cycle.copy()
+        base.add_node(5)
+        delta=gmm.delta.GraphDelta(base)
+        gmm.rules.preferential_attach(m=50)(delta,self.test_triangle,random.RandomState(1))
+        self.assertEquals(delta.apply().degree(5),0)
+
+    def test_node_labels(self):
+        """Tests that base nodes are drawn uniformly whether or not they are labeled by integers"""
+        named=nx.relabel_nodes(self.five_cycle,dict((i,"abcde"[i]) for i in range(5)))
+        mixed=nx.Graph(data=[(0,"b"),("b","c"),("c","d"),("d",0)])
+        for base in [named,mixed]:
+            for rule in [gmm.rules.random_attach(edges=3),gmm.rules.binomial_attach(0.5),
+                gmm.rules.watts_strogatz_attach(k=2,p=0.5)]:
+                delta=gmm.delta.GraphDelta(base.copy())
+                rule(delta,self.test_triangle,random.RandomState(0))
+                self.assertEquals(delta.apply().number_of_nodes(),base.number_of_nodes()+3)
+        rng=random.RandomState(0)
+        drawn=gmm.rules._sample_nodes(gmm.delta.GraphDelta(mixed),4000,rng)
+        for v in mixed:
+            self.assertAlmostEquals(drawn.count(v)/4000.0,0.25,places=1)
+        distinct=gmm.rules._sample_nodes(gmm.delta.GraphDelta(mixed),3,rng,distinct=True)
+        self.assertEquals(len(set(distinct)),3)
+
+    def test_component_fusion(self):
+        """Tests that fusion ties components through new structure and can keep the base
+        bipartite"""
+        G=self.grow(gmm.rules.component_fusion(p=1.0))
+        self.assertEquals(nx.number_connected_components(G),1)
+        G=self.grow(gmm.rules.component_fusion(p=0.0))
+        self.assertTrue(nx.number_connected_components(G)>1)
+        for p in [0.5,1.0]:
+            G=self.grow(gmm.rules.component_fusion(p=p,bipartite=True),nx.path_graph(6))
+            self.assertTrue(nx.is_bipartite(G))
+        # A base that is not bipartite cannot be kept bipartite
+        triangle_tail=nx.Graph(data=[(0,1),(1,2),(0,2),(2,3)])
+        self.assertRaises(ValueError,gmm.gmm,triangle_tail,None,
+            gmm.rules.component_fusion(p=1.0,bipartite=True))
+        model=gmm.gmm(triangle_tail,lambda G: G.number_of_nodes()<40,
+            gmm.rules.component_fusion(p=0.5,bipartite=True),seed=0)
+        self.assertRaises(ValueError,gmm.algorithms.simulate,model,3)
+        # New structure that is not bipartite is skipped whether or not it fuses components
+        for p in [0.0,1.0]:
+            delta=gmm.delta.GraphDelta(nx.path_graph(6))
+            gmm.rules.component_fusion(p=p,bipartite=True)(delta,self.test_triangle,
+                random.RandomState(0))
+            self.assertEquals(len(delta),0)
+            self.assertEquals(delta.apply().number_of_nodes(),6)
+        directed=nx.DiGraph(data=[(0,1),(2,1),(2,3),(4,3)])
+        G=self.grow(gmm.rules.component_fusion(p=0.5,bipartite=True),directed,ceiling=40)
+        self.assertTrue(nx.is_bipartite(G.to_undirected()))
+
+if __name__ == '__main__':
+    unittest.main()
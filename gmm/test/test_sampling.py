@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# encoding: utf-8
+"""
+test_sampling.py
+
+Purpose:  Tests for the samplers used to draw from motif distributions
+
+Author:   Drew Conway
+Email:    drew.conway@nyu.edu
+
+"""
+
+import unittest
+import networkx as nx
+from numpy import bincount, random
+import gmm
+
+class test_sampling(unittest.TestCase):
+    """Tests for discrete samplers"""
+
+    # Unnormalized weights, including a zero
+    weights=[1.0,0.0,3.0,4.0,2.0]
+
+    def test_alias_sampler(self):
+        """Tests that alias draws follow the weights and never return zero weight indices"""
+        sampler=gmm.sampling.AliasSampler(self.weights,random.RandomState(0))
+        draws=sampler.draw(size=100000)
+        frequencies=bincount(draws,minlength=len(self.weights))/100000.0
+        self.assertEquals(frequencies[1],0)
+        for f,w in zip(frequencies,self.weights):
+            self.assertAlmostEquals(f,w/sum(self.weights),places=2)
+        self.assertTrue(sampler.draw() in [0,2,3,4])
+        self.assertRaises(ValueError,gmm.sampling.AliasSampler,[0.0,0.0])
+        self.assertRaises(ValueError,gmm.sampling.AliasSampler,[1.0,-1.0])
+
+    def test_fenwick_sampler(self):
+        """Tests that Fenwick draws follow the weights as they are updated and appended"""
+        sampler=gmm.sampling.FenwickSampler(self.weights,random.RandomState(0))
+        sampler.update(0,3.0)
+        sampler.append(0.0)
+        sampler.append(2.0)
+        weights=[4.0,0.0,3.0,4.0,2.0,0.0,2.0]
+        self.assertEquals(sampler.weights,weights)
+        self.assertEquals(sampler.capacity,8)
+        frequencies=bincount(sampler.draw(size=100000),minlength=len(weights))/100000.0
+        self.assertEquals(frequencies[1],0)
+        self.assertEquals(frequencies[5],0)
+        for f,w in zip(frequencies,weights):
+            self.assertAlmostEquals(f,w/sum(weights),places=2)
+        self.assertEquals([sampler.find(u) for u in [0,3.9,4,6.9,7,11,13]],[0,0,2,2,3,4,6])
+        # Draws rounded up to the total never return trailing indices of zero weight
+        sampler.append(0.0)
+        self.assertEquals(sampler.total(),sum(weights))
+        self.assertEquals(sampler.find(sampler.total()),6)
+        self.assertRaises(ValueError,sampler.update,1,-1.0)
+        self.assertRaises(ValueError,gmm.sampling.FenwickSampler([0]).draw)
+
+    def test_fenwick_build(self):
+        """Tests that Fenwick draws follow the weights when the tree is built from a number of
+        positive weights that is not a power of two and then appended to"""
+        sampler=gmm.sampling.FenwickSampler([1,1,1,1,5],random.RandomState(0))
+        self.assertEquals(sampler.tree[8],9)
+        sampler.append(1)
+        weights=[1,1,1,1,5,1]
+        frequencies=bincount(sampler.draw(size=100000),minlength=len(weights))/100000.0
+        for f,w in zip(frequencies,weights):
+            self.assertAlmostEquals(f,float(w)/sum(weights),places=2)
+        for size in range(1,24):
+            sampler=gmm.sampling.FenwickSampler(range(1,size+1))
+            self.assertEquals(sampler.tree[sampler.capacity],size*(size+1)/2)
+
+    def test_degree_sampler(self):
+        """Tests that degree samplers follow the degrees of the base of a model as it grows"""
+        star=nx.star_graph(4)
+        star.add_node(5)
+        model=gmm.gmm(star,lambda G: G.number_of_nodes()<50,gmm.rules.preferential_attach(m=2),seed=0)
+        sampler=model.degree_sampler()
+        self.assertEquals(sampler.draw(size=1000,rng=random.RandomState(0)).count(5),0)
+        gmm.algorithms.simulate(model,3)
+        G=model.get_base()
+        self.assertTrue(model.degree_sampler() is sampler)
+        self.assertEquals([sampler.degree(v) for v in G],G.degree(G.nodes()).values())
+        self.assertEquals(sampler.total(),2*G.number_of_edges())
+    
+    def test_spawn(self):
+        """Tests that spawned streams are reproducible, independent of how many are spawned, and 
+        distinct from each other"""
+        first=[r.randint(2**30) for r in gmm.sampling.spawn(42,3)]
+        second=[r.randint(2**30) for r in gmm.sampling.spawn(42,5)]
+        self.assertEquals(first,second[:3])
+        self.assertEquals(len(set(second)),5)
+        self.assertNotEquals(first,[r.randint(2**30) for r in gmm.sampling.spawn(2**40+42,3)])
+        state=random.RandomState(1)
+        self.assertTrue(gmm.sampling.random_state(state) is state)
+
+if __name__ == '__main__':
+    unittest.main()
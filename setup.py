@@ -7,6 +7,7 @@ setup(
     author='Drew Conway',
     author_email='drew.conway@nyu.edu',
     packages=['gmm', 'gmm.test'],
+    package_data={'gmm': ['data/atlas.txt']},
     scripts=[],
     url='http://pypi.python.org/pypi/GMM/',
     license='LICENSE.txt',